@@ -0,0 +1,48 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""响应头字符集选择的测试"""
+
+import os
+import shutil
+import tempfile
+import unittest
+
+from website_converter.cli import parse_args
+from website_converter.core import WebsiteConverter
+
+
+class HeaderCharsetTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        args = parse_args(['--url', 'https://example.com', '--no-download',
+                           '--download-dir', os.path.join(self.tmp, 'dl'), '--output', os.path.join(self.tmp, 'out')])
+        self.converter = WebsiteConverter(args)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp)
+
+    def title(self, raw_content, charset):
+        return self.converter._read_index_entry('page.html', 'page.html', raw_content, charset)['title']
+
+    def test_header_charset_wins_over_short_valid_utf8(self):
+        # GBK的“页”（D2 B3）恰好也是合法的UTF-8
+        raw_content = '<title>GBK页</title>'.encode('gbk')
+        self.assertEqual(raw_content.decode('utf-8'), '<title>GBKҳ</title>')
+        self.assertEqual(self.title(raw_content, 'gbk'), 'GBK页')
+
+    def test_default_single_byte_header_does_not_override_utf8(self):
+        raw_content = '<title>中文页面</title>'.encode('utf-8')
+        self.assertEqual(self.title(raw_content, 'iso8859-1'), '中文页面')
+        self.assertEqual(self.title(raw_content, 'cp1252'), '中文页面')
+
+    def test_default_single_byte_header_used_for_non_utf8(self):
+        self.assertEqual(self.title('<title>café</title>'.encode('cp1252'), 'cp1252'), 'café')
+
+    def test_conflicting_meta_charset_ignores_header(self):
+        raw_content = '<meta charset="utf-8"><title>中文页面</title>'.encode('utf-8')
+        self.assertEqual(self.title(raw_content, 'gbk'), '中文页面')
+
+
+if __name__ == '__main__':
+    unittest.main()
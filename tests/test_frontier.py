@@ -0,0 +1,50 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""抓取队列URL规范化的测试"""
+
+import unittest
+
+from website_converter.frontier import normalize_url, remove_dot_segments
+
+
+class NormalizeUrlTest(unittest.TestCase):
+
+    def test_ipv6_host_keeps_brackets(self):
+        self.assertEqual(normalize_url('http://[2001:DB8::1]/x'), 'http://[2001:db8::1]/x')
+        self.assertEqual(normalize_url('http://[2001:db8::1]:8080/x'), 'http://[2001:db8::1]:8080/x')
+        self.assertEqual(normalize_url('http://[2001:db8::1]:80/x'), 'http://[2001:db8::1]/x')
+
+    def test_empty_segments_are_kept(self):
+        self.assertEqual(normalize_url('http://example.com/a//b.html'), 'http://example.com/a//b.html')
+        self.assertEqual(normalize_url('http://example.com/a//b'), 'http://example.com/a//b')
+
+    def test_dot_segments_follow_rfc3986(self):
+        self.assertEqual(normalize_url('http://example.com/a/b/..'), 'http://example.com/a/')
+        self.assertEqual(normalize_url('http://example.com/a/./b/../c.html'), 'http://example.com/a/c.html')
+        self.assertEqual(normalize_url('http://example.com/../a'), 'http://example.com/a')
+        self.assertEqual(normalize_url('http://example.com/a/.'), 'http://example.com/a/')
+        self.assertEqual(normalize_url('http://example.com/a/b.c/d'), 'http://example.com/a/b.c/d')
+
+    def test_remove_dot_segments_rfc_examples(self):
+        self.assertEqual(remove_dot_segments('/a/b/c/./../../g'), '/a/g')
+        self.assertEqual(remove_dot_segments('/b/c/..'), '/b/')
+        self.assertEqual(remove_dot_segments('/..'), '/')
+
+    def test_query_is_not_reencoded(self):
+        self.assertEqual(normalize_url('http://example.com/s?q=a%20b&flag'), 'http://example.com/s?flag&q=a%20b')
+        self.assertEqual(normalize_url('http://example.com/s?b=1&a=x+y'), 'http://example.com/s?a=x+y&b=1')
+
+    def test_ignored_params_are_dropped(self):
+        self.assertEqual(normalize_url('http://example.com/s?utm_source=x&q=1&UTM_medium=y&fbclid=z'),
+                         'http://example.com/s?q=1')
+        self.assertEqual(normalize_url('http://example.com/s?utm_source=x'), 'http://example.com/s')
+
+    def test_repeated_params_keep_their_order(self):
+        self.assertEqual(normalize_url('http://example.com/s?a=2&b=1&a=1'), 'http://example.com/s?a=2&a=1&b=1')
+
+    def test_scheme_host_port_and_fragment(self):
+        self.assertEqual(normalize_url('HTTPS://Example.COM:443#top'), 'https://example.com/')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,42 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""离线优化中外部脚本处理的测试"""
+
+import unittest
+
+from website_converter.offline import OfflineOptimizer
+
+
+class ScriptTest(unittest.TestCase):
+
+    def setUp(self):
+        mirrored = {'https://code.jquery.com/jquery.js': '/code.jquery.com/jquery.js'}
+        self.optimizer = OfflineOptimizer(mirrored.get)
+
+    def optimize(self, html):
+        return self.optimizer.optimize(html)[0]
+
+    def test_script_with_body_is_deferred(self):
+        self.assertEqual(self.optimize('<script src="https://cdn.example.com/a.js">\n// legacy\n</script>'),
+                         '<script defer src="https://cdn.example.com/a.js">\n// legacy\n</script>')
+
+    def test_uppercase_tag(self):
+        self.assertEqual(self.optimize('<SCRIPT SRC="https://cdn.example.com/a.js"></SCRIPT>'),
+                         '<SCRIPT defer SRC="https://cdn.example.com/a.js"></SCRIPT>')
+
+    def test_only_opening_tag_is_localized(self):
+        self.assertEqual(self.optimize('<script src="https://code.jquery.com/jquery.js">'
+                                       '/* https://code.jquery.com/jquery.js */</script>'),
+                         '<script src="/code.jquery.com/jquery.js">/* https://code.jquery.com/jquery.js */</script>')
+
+    def test_tracker_is_removed_with_body(self):
+        self.assertEqual(self.optimize('a<script src="https://hm.baidu.com/hm.js">var x = 1;</script>b'), 'ab')
+
+    def test_inline_and_data_src_scripts_are_kept(self):
+        html = ('<script>var url = "https://cdn.example.com/a.js";</script>'
+                '<script data-src="https://cdn.example.com/b.js"></script>')
+        self.assertEqual(self.optimize(html), html)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,558 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+性能基准测试模块
+
+提供若干本地基准测试，用于比较不同版本之间的性能差异：
+
+    python -m website_converter.bench startup [--runs N] [--json]
+    python -m website_converter.bench frontier [--urls N] [--hosts N] [--json]
+    python -m website_converter.bench fixhtml [--pages N] [--json]
+    python -m website_converter.bench serve [--clients N] [--duration S] [--zipf S | --log FILE] [--json]
+"""
+
+import argparse
+import json
+import os
+import random
+import re
+import subprocess
+import sys
+import tempfile
+import time
+
+# 启动时不应加载的重量级模块
+HEAVY_MODULES = ('markdown', 'http.server', 'socketserver', 'webbrowser', 'threading', 'subprocess')
+
+
+def _parse_importtime(stderr):
+    """解析 -X importtime 输出，返回 {模块名: 累计微秒}"""
+    modules = {}
+    for line in stderr.splitlines():
+        if not line.startswith('import time:'):
+            continue
+        parts = line[len('import time:'):].split('|')
+        if len(parts) != 3:
+            continue
+        try:
+            cumulative = int(parts[1].strip())
+        except ValueError:
+            continue
+        modules[parts[2].strip()] = cumulative
+    return modules
+
+
+def _run_python(args, cwd=None):
+    """运行一次Python子进程，返回 (耗时秒, stderr文本)"""
+    start = time.perf_counter()
+    result = subprocess.run([sys.executable] + args, stdout=subprocess.PIPE, stderr=subprocess.PIPE, cwd=cwd)
+    elapsed = time.perf_counter() - start
+    return elapsed, result.stderr.decode('utf-8', errors='replace')
+
+
+def _create_sample_tree(directory, count=5):
+    """生成一个小型HTML测试目录"""
+    for i in range(count):
+        with open(os.path.join(directory, f'page{i}.html'), 'w', encoding='utf-8') as f:
+            f.write(f'<html><head><title>页面{i}</title></head><body><a href="page{i + 1}">下一页</a></body></html>')
+
+
+def bench_startup(runs=5):
+    """测量命令行启动开销"""
+    env_cwd = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    report = {}
+
+    # 导入耗时以及被加载的重量级模块
+    for module in ('website_converter.cli', 'website_converter.core'):
+        _, stderr = _run_python(['-X', 'importtime', '-c', f'import {module}'], cwd=env_cwd)
+        modules = _parse_importtime(stderr)
+        report[f'import {module}'] = {
+            'cumulative_us': modules.get(module, 0),
+            'modules_loaded': len(modules),
+            'heavy_loaded': [name for name in HEAVY_MODULES if name in modules],
+        }
+
+    # 典型短时调用的墙钟时间
+    with tempfile.TemporaryDirectory() as tmp:
+        src = os.path.join(tmp, 'src')
+        os.makedirs(src)
+        _create_sample_tree(src)
+        cases = {
+            '--help': ['-m', 'website_converter.cli', '--help'],
+            '--no-download': ['-m', 'website_converter.cli', '--no-download', '--download-dir', src,
+                              '--output', os.path.join(tmp, 'out'), '--file-types', 'html-only', '--timeout', '0'],
+        }
+        for name, args in cases.items():
+            timings = []
+            heavy = []
+            for _ in range(runs):
+                elapsed, stderr = _run_python(['-X', 'importtime'] + args, cwd=env_cwd)
+                timings.append(elapsed)
+                modules = _parse_importtime(stderr)
+                heavy = [m for m in HEAVY_MODULES if m in modules]
+            timings.sort()
+            report[name] = {
+                'runs': runs,
+                'min_ms': round(timings[0] * 1000, 2),
+                'median_ms': round(timings[len(timings) // 2] * 1000, 2),
+                'heavy_loaded': heavy,
+            }
+    return report
+
+
+def _synthetic_urls(total, hosts):
+    """生成分布在多个主机上的测试URL"""
+    for i in range(total):
+        host = i % hosts
+        yield f'https://Host{host}.example.com:443/section{i % 97}/page{i}.html?b={i % 7}&a=1&utm_source=x#top'
+
+
+def bench_frontier(total=200000, hosts=1000):
+    """测量抓取队列的内存占用与入队/出队吞吐量"""
+    import tracemalloc
+
+    from website_converter.frontier import Frontier, SeenSet, normalize_url
+
+    report = {}
+    scale = 1000000 / total
+
+    # URL规范化
+    urls = list(_synthetic_urls(total, hosts))
+    start = time.perf_counter()
+    for url in urls:
+        normalize_url(url)
+    elapsed = time.perf_counter() - start
+    report['normalize'] = {'urls': total, 'urls_per_sec': int(total / elapsed)}
+
+    # 已见集合：插入吞吐
+    seen = SeenSet(expected=total)
+    start = time.perf_counter()
+    for url in urls:
+        seen.add(url)
+    elapsed = time.perf_counter() - start
+
+    # 已见集合：内存（单独测量，tracemalloc会显著拖慢插入）
+    tracemalloc.start()
+    base = tracemalloc.get_traced_memory()[0]
+    measured = SeenSet(expected=total)
+    for url in urls:
+        measured.add(url)
+    used, peak = tracemalloc.get_traced_memory()
+    used, peak = used - base, peak - base
+    tracemalloc.stop()
+    report['seen_set'] = {
+        'urls': total,
+        'adds_per_sec': int(total / elapsed),
+        'bytes_per_url': round(used / total, 2),
+        'mb_per_million_urls': round(used * scale / 1024 / 1024, 2),
+        'peak_mb': round(peak / 1024 / 1024, 2),
+        'final_mb': round(used / 1024 / 1024, 2),
+        'bloom_false_positives': seen.false_positives,
+    }
+
+    # 调度队列：入队、出队吞吐（关闭礼貌限速，只测数据结构开销）
+    frontier = Frontier(rate=float('inf'), burst=1, expected_urls=total)
+    start = time.perf_counter()
+    for url in urls:
+        frontier.push(url, depth=len(url) % 5)
+    push_elapsed = time.perf_counter() - start
+
+    start = time.perf_counter()
+    popped = 0
+    while frontier.pop() is not None:
+        popped += 1
+    pop_elapsed = time.perf_counter() - start
+    report['frontier'] = {
+        'urls': total,
+        'hosts': hosts,
+        'enqueue_per_sec': int(total / push_elapsed),
+        'dequeue_per_sec': int(popped / pop_elapsed),
+    }
+    return report
+
+
+def _sample_page(i):
+    """生成一个典型的UTF-8页面"""
+    links = ''.join(f'<li><a href="../section{j}/page{j}.html">第{j}篇文章</a> <img src="/img/{j}.png"></li>'
+                    for j in range(i % 40, i % 40 + 60))
+    body = '<p>这是一段用于基准测试的正文内容，包含中文与 ASCII text。</p>' * 30
+    return (f'<!DOCTYPE html><html><head><meta charset="utf-8"><title>页面 {i}</title>'
+            f'<link rel="stylesheet" href="https://cdn.example.com/site.css"></head>'
+            f'<body><h1>页面 {i}</h1><ul>{links}</ul>{body}</body></html>')
+
+
+def bench_fix_html(pages=500):
+    """比较HTML修复的字节快速路径与文本路径的CPU耗时和内存分配"""
+    import contextlib
+    import io
+    import tracemalloc
+
+    from website_converter.cli import parse_args
+    from website_converter.core import WebsiteConverter
+
+    report = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        src_dir = os.path.join(tmp, 'src')
+        os.makedirs(src_dir)
+        sources = []
+        for i in range(pages):
+            path = os.path.join(src_dir, f'page{i}.html')
+            with open(path, 'w', encoding='utf-8') as f:
+                f.write(_sample_page(i))
+            sources.append(path)
+        total_bytes = sum(os.path.getsize(p) for p in sources)
+
+        args = parse_args(['--url', 'https://bench.example.com/', '--no-download', '--download-dir', src_dir,
+                           '--output', os.path.join(tmp, 'out'), '--io-threads', '0'])
+        args.file_types = ['html']
+
+        for name, fast in (('text_path', False), ('byte_fast_path', True)):
+            converter = WebsiteConverter(args)
+            converter.byte_fast_path = fast
+            out_dir = os.path.join(tmp, 'out', name)
+
+            def run_all():
+                with contextlib.redirect_stdout(io.StringIO()):
+                    for i, path in enumerate(sources):
+                        converter._fix_html_file(path, os.path.join(out_dir, f'page{i}.html'))
+
+            run_all()  # 预热，创建输出目录
+            wall = time.perf_counter()
+            cpu = time.process_time()
+            run_all()
+            cpu = time.process_time() - cpu
+            wall = time.perf_counter() - wall
+
+            tracemalloc.start()
+            run_all()
+            _, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+
+            report[name] = {
+                'pages': pages,
+                'mb': round(total_bytes / 1024 / 1024, 2),
+                'cpu_ms_per_page': round(cpu * 1000 / pages, 3),
+                'mb_per_sec': round(total_bytes / 1024 / 1024 / wall, 2),
+                'peak_alloc_kb': round(peak / 1024, 1),
+            }
+
+    text, fast = report['text_path'], report['byte_fast_path']
+    report['saving'] = {
+        'cpu_percent': round((1 - fast['cpu_ms_per_page'] / text['cpu_ms_per_page']) * 100, 1),
+        'peak_alloc_percent': round((1 - fast['peak_alloc_kb'] / text['peak_alloc_kb']) * 100, 1),
+    }
+    return report
+
+
+BENCH_URL = 'https://bench.example.com/'
+BENCH_DOMAIN = 'bench.example.com'
+
+
+def _serve(mode, src_dir, out_dir):
+    """基准测试用的服务器进程：监听随机端口，把端口号写到标准输出后开始服务"""
+    if mode == 'on-demand':
+        from website_converter.cli import parse_args
+        from website_converter.core import WebsiteConverter
+        from website_converter.ondemand import OnDemandHTTPServer, OnDemandSite
+
+        args = parse_args(['--url', BENCH_URL, '--no-download', '--download-dir', src_dir,
+                           '--output', out_dir, '--on-demand', '--io-threads', '0'])
+        args.file_types = ['html']
+        converter = WebsiteConverter(args)
+        converter._create_default_css()
+        os.chdir(out_dir)
+        httpd = OnDemandHTTPServer(('127.0.0.1', 0), OnDemandSite(converter), verbose=False)
+    else:
+        from website_converter.server import MirrorHTTPServer
+
+        os.chdir(out_dir)
+        httpd = MirrorHTTPServer(('127.0.0.1', 0), verbose=False)
+
+    print(httpd.server_address[1], flush=True)
+    # 之后的转换输出不再写入管道，以免缓冲区写满阻塞服务器
+    sys.stdout = open(os.devnull, 'w')
+    httpd.serve_forever()
+
+
+def _process_rss_kb(pid):
+    """读取进程的当前与峰值常驻内存（KB），不支持 /proc 的平台返回None"""
+    try:
+        with open(f'/proc/{pid}/status') as f:
+            status = f.read()
+    except OSError:
+        return None
+    values = dict(re.findall(r'^(VmRSS|VmHWM):\s+(\d+) kB', status, re.MULTILINE))
+    return {name: int(value) for name, value in values.items()}
+
+
+def _zipf_paths(paths, exponent, seed=0):
+    """按Zipf分布（排名越靠前访问越多）无限生成访问路径"""
+    rng = random.Random(seed)
+    cum_weights = []
+    total = 0.0
+    for rank in range(1, len(paths) + 1):
+        total += 1.0 / rank ** exponent
+        cum_weights.append(total)
+    while True:
+        for path in rng.choices(paths, cum_weights=cum_weights, k=1024):
+            yield path
+
+
+def _log_paths(log_file):
+    """从访问日志中读取请求路径并循环重放；支持服务器日志格式或每行一个路径"""
+    paths = []
+    with open(log_file, 'r', encoding='utf-8', errors='replace') as f:
+        for line in f:
+            match = re.search(r'"(?:GET|HEAD) (\S+)', line)
+            if match:
+                paths.append(match.group(1))
+            elif line.startswith('/'):
+                paths.append(line.strip())
+    if not paths:
+        raise ValueError(f"访问日志中没有可重放的请求: {log_file}")
+    while True:
+        for path in paths:
+            yield path
+
+
+async def _read_response(reader):
+    """读取一个HTTP响应，返回 (状态码, 是否可复用连接, 响应体字节数)"""
+    status_line = await reader.readline()
+    if not status_line:
+        raise ConnectionResetError('服务器关闭了连接')
+    version, status = status_line.split()[:2]
+    headers = {}
+    while True:
+        line = await reader.readline()
+        if line in (b'\r\n', b'\n', b''):
+            break
+        name, _, value = line.decode('iso-8859-1').partition(':')
+        headers[name.strip().lower()] = value.strip().lower()
+
+    connection = headers.get('connection', '')
+    keep_alive = 'keep-alive' in connection if version == b'HTTP/1.0' else 'close' not in connection
+    length = headers.get('content-length')
+    if length is not None:
+        body = await reader.readexactly(int(length))
+    else:
+        body = await reader.read()
+        keep_alive = False
+    return int(status), keep_alive, len(body)
+
+
+async def _load_client(port, next_path, deadline, timeout, results):
+    """保持连接的客户端：连接被服务器关闭时重新连接"""
+    import asyncio
+
+    reader = writer = None
+    while time.perf_counter() < deadline:
+        path = next_path()
+        if path is None:
+            break
+        request = f'GET {path} HTTP/1.1\r\nHost: 127.0.0.1:{port}\r\nConnection: keep-alive\r\n\r\n'.encode()
+        start = time.perf_counter()
+        try:
+            if writer is None:
+                reader, writer = await asyncio.wait_for(asyncio.open_connection('127.0.0.1', port), timeout)
+                results['connections'] += 1
+            writer.write(request)
+            status, keep_alive, size = await asyncio.wait_for(_read_response(reader), timeout)
+        except (OSError, ValueError, asyncio.TimeoutError, asyncio.IncompleteReadError) as e:
+            name = type(e).__name__
+            results['errors'][name] = results['errors'].get(name, 0) + 1
+            if writer is not None:
+                writer.close()
+            writer = None
+            continue
+
+        results['latencies'].append(time.perf_counter() - start)
+        results['bytes'] += size
+        if status >= 400:
+            results['errors'][f'HTTP {status}'] = results['errors'].get(f'HTTP {status}', 0) + 1
+        if not keep_alive:
+            writer.close()
+            writer = None
+    if writer is not None:
+        writer.close()
+
+
+async def _sample_rss(pid, samples, stop):
+    """定期采样服务器进程的常驻内存"""
+    import asyncio
+
+    while not stop.is_set():
+        rss = _process_rss_kb(pid)
+        if rss is not None and 'VmRSS' in rss:
+            samples.append(rss['VmRSS'])
+        try:
+            await asyncio.wait_for(stop.wait(), 0.1)
+        except asyncio.TimeoutError:
+            pass
+
+
+def _percentile(sorted_values, percent):
+    """最近秩法计算百分位数"""
+    if not sorted_values:
+        return None
+    rank = max(1, int(round(percent / 100.0 * len(sorted_values) + 0.5)))
+    return sorted_values[min(rank, len(sorted_values)) - 1]
+
+
+def bench_serve(clients=16, duration=10.0, requests=None, pages=200, zipf=1.1, log_file=None,
+                mode='static', timeout=5.0):
+    """对内置HTTP服务器施加并发负载，测量吞吐量、延迟分布、错误与服务器内存"""
+    import asyncio
+
+    paths = [f'/{BENCH_DOMAIN}/page{i}.html' for i in range(pages)]
+    access = _log_paths(log_file) if log_file else _zipf_paths(paths, zipf)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        src_dir = os.path.join(tmp, 'src')
+        out_dir = os.path.join(tmp, 'out')
+        os.makedirs(src_dir)
+        for i in range(pages):
+            with open(os.path.join(src_dir, f'page{i}.html'), 'w', encoding='utf-8') as f:
+                f.write(_sample_page(i))
+
+        # 静态模式先用命令行完成一次转换，按需模式由服务器在请求时转换
+        package_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+        if mode == 'static':
+            subprocess.run([sys.executable, '-m', 'website_converter.cli', '--url', BENCH_URL, '--no-download',
+                            '--download-dir', src_dir, '--output', out_dir, '--file-types', 'html-only',
+                            '--timeout', '0'], stdout=subprocess.DEVNULL, cwd=package_root, check=True)
+        else:
+            os.makedirs(out_dir)
+
+        server = subprocess.Popen(
+            [sys.executable, '-c', f'from website_converter.bench import _serve; _serve({mode!r}, {src_dir!r}, {out_dir!r})'],
+            stdout=subprocess.PIPE, cwd=package_root)
+        try:
+            port = int(server.stdout.readline())
+            rss_start = _process_rss_kb(server.pid)
+
+            remaining = [requests]
+
+            def next_path():
+                if remaining[0] is not None:
+                    if remaining[0] <= 0:
+                        return None
+                    remaining[0] -= 1
+                return next(access)
+
+            results = {'latencies': [], 'errors': {}, 'connections': 0, 'bytes': 0}
+            rss_samples = []
+
+            async def run():
+                stop = asyncio.Event()
+                sampler = asyncio.ensure_future(_sample_rss(server.pid, rss_samples, stop))
+                deadline = time.perf_counter() + (duration if requests is None else float('inf'))
+                await asyncio.gather(*(_load_client(port, next_path, deadline, timeout, results)
+                                       for _ in range(clients)))
+                stop.set()
+                await sampler
+
+            loop = asyncio.new_event_loop()
+            start = time.perf_counter()
+            try:
+                loop.run_until_complete(run())
+            finally:
+                loop.close()
+            elapsed = time.perf_counter() - start
+            rss_end = _process_rss_kb(server.pid)
+        finally:
+            server.terminate()
+            server.wait()
+
+    latencies = sorted(results['latencies'])
+    completed = len(latencies)
+    report = {
+        'config': {
+            'mode': mode,
+            'clients': clients,
+            'pages': pages,
+            'access': f'log:{os.path.basename(log_file)}' if log_file else f'zipf:{zipf}',
+        },
+        'throughput': {
+            'requests': completed,
+            'seconds': round(elapsed, 3),
+            'requests_per_sec': round(completed / elapsed, 1),
+            'mb_per_sec': round(results['bytes'] / 1024 / 1024 / elapsed, 2),
+            'connections': results['connections'],
+        },
+        'latency_ms': {
+            name: round(_percentile(latencies, p) * 1000, 3) if latencies else None
+            for name, p in (('p50', 50), ('p95', 95), ('p99', 99), ('max', 100))
+        },
+        'errors': dict(results['errors'], total=sum(results['errors'].values())),
+    }
+    if rss_start is not None:
+        report['server_rss_mb'] = {
+            'start': round(rss_start.get('VmRSS', 0) / 1024, 1),
+            'max_sampled': round(max(rss_samples, default=0) / 1024, 1),
+            'end': round(rss_end.get('VmRSS', 0) / 1024, 1) if rss_end else None,
+            'peak': round(rss_end.get('VmHWM', 0) / 1024, 1) if rss_end else None,
+        }
+    return report
+
+
+def _print_report(report):
+    """以文本形式打印报告"""
+    for name, data in report.items():
+        print(f"{name}:")
+        for key, value in data.items():
+            print(f"    {key}: {value}")
+
+
+def main(argv=None):
+    """基准测试入口"""
+    parser = argparse.ArgumentParser(description='网站转换工具性能基准测试')
+    subparsers = parser.add_subparsers(dest='command')
+
+    startup = subparsers.add_parser('startup', help='测量命令行启动与模块导入开销')
+    startup.add_argument('--runs', type=int, default=5, help='每种调用重复的次数')
+    startup.add_argument('--json', action='store_true', help='以JSON格式输出结果')
+
+    frontier = subparsers.add_parser('frontier', help='测量抓取队列的内存占用与吞吐量')
+    frontier.add_argument('--urls', type=int, default=200000, help='测试URL数量')
+    frontier.add_argument('--hosts', type=int, default=1000, help='测试主机数量')
+    frontier.add_argument('--json', action='store_true', help='以JSON格式输出结果')
+
+    fix_html = subparsers.add_parser('fixhtml', help='比较HTML修复字节快速路径与文本路径的开销')
+    fix_html.add_argument('--pages', type=int, default=500, help='测试页面数量')
+    fix_html.add_argument('--json', action='store_true', help='以JSON格式输出结果')
+
+    serve = subparsers.add_parser('serve', help='对内置HTTP服务器施加并发负载，测量吞吐量与延迟分布')
+    serve.add_argument('--clients', type=int, default=16, help='并发的保持连接客户端数量')
+    serve.add_argument('--duration', type=float, default=10.0, help='持续时间，单位为秒')
+    serve.add_argument('--requests', type=int, help='总请求数（指定后忽略 --duration）')
+    serve.add_argument('--pages', type=int, default=200, help='生成的测试页面数量')
+    serve.add_argument('--zipf', type=float, default=1.1, help='页面访问的Zipf分布指数，越大越集中于热门页面')
+    serve.add_argument('--log', dest='log_file', help='重放访问日志中的请求路径，代替Zipf分布')
+    serve.add_argument('--mode', choices=['static', 'on-demand'], default='static',
+                       help='static: 先转换再服务；on-demand: 按需转换模式')
+    serve.add_argument('--timeout', type=float, default=5.0, help='单个请求的超时时间，单位为秒')
+    serve.add_argument('--json', action='store_true', help='以JSON格式输出结果')
+
+    args = parser.parse_args(argv)
+    if args.command == 'startup':
+        report = bench_startup(args.runs)
+    elif args.command == 'frontier':
+        report = bench_frontier(args.urls, args.hosts)
+    elif args.command == 'fixhtml':
+        report = bench_fix_html(args.pages)
+    elif args.command == 'serve':
+        report = bench_serve(args.clients, args.duration, args.requests, args.pages, args.zipf,
+                             args.log_file, args.mode, args.timeout)
+    else:
+        parser.print_help()
+        return 1
+
+    if args.json:
+        print(json.dumps(report, ensure_ascii=False, indent=2))
+    else:
+        _print_report(report)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
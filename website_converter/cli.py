@@ -11,10 +11,22 @@ import sys
 import os
 import signal
 from pathlib import Path
-from website_converter.core import WebsiteConverter
 
+# 未指定 --timeout 时的总执行时间限制（秒）；监视模式默认不限制
+DEFAULT_TIMEOUT = 3600
 
-def parse_args():
+
+def _shard_spec(value):
+    """校验 --shard 参数"""
+    from website_converter.shard import parse_shard_spec
+
+    try:
+        return parse_shard_spec(value)
+    except ValueError as e:
+        raise argparse.ArgumentTypeError(str(e))
+
+
+def parse_args(argv=None):
     """解析命令行参数"""
     parser = argparse.ArgumentParser(description='网站下载、转换一体化工具')
     parser.add_argument('--url', '-u', required=False, help='要下载的网站URL，不提供则只处理本地文件')
@@ -29,9 +41,39 @@ def parse_args():
     parser.add_argument('--port', '-p', type=int, default=8080, help='HTTP服务器端口')
     parser.add_argument('--depth', type=int, default=5, help='HTTrack下载深度，默认5级')
     parser.add_argument('--httrack-options', default='', help='HTTrack附加选项')
+    parser.add_argument('--httrack-bin', default='httrack', help='httrack可执行文件的路径 (default: httrack)')
+    parser.add_argument('--parallel', type=int, default=1,
+                      help='并行下载的httrack进程数，按URL路径前缀划分互不重叠的分区 (default: 1)')
+    parser.add_argument('--partitions', help='并行下载时手工指定的路径前缀，逗号分隔，如 /docs,/blog')
+    parser.add_argument('--sitemap', help='并行下载时按站点地图（本地文件或URL）中的URL划分分区，默认使用入口页面中的链接')
+    parser.add_argument('--sockets', type=int, default=2, help='并行下载时每个httrack进程的连接数 (default: 2)')
     parser.add_argument('--title', default='网站离线镜像', help='网站标题')
-    parser.add_argument('--timeout', '-t', type=int, default=3600, help='总执行时间限制，单位为秒 (default: 3600)')
-    return parser.parse_args()
+    parser.add_argument('--io-threads', type=int, default=4, help='后台写入线程数，0表示同步写入 (default: 4)')
+    parser.add_argument('--atomic-write', action='store_true', help='先写入临时文件再原子重命名，避免产生不完整的输出文件')
+    parser.add_argument('--resume', action='store_true', help='从上次被超时或Ctrl+C中断的运行继续，跳过已完成的文件')
+    parser.add_argument('--shard', type=_shard_spec, default=None, metavar='i/N',
+                      help='只转换按路径哈希分到第i个分片（共N个）的文件，并输出该分片的元数据片段')
+    parser.add_argument('--merge', action='store_true', help='合并输出目录中各分片的元数据片段，生成最终索引页面')
+    parser.add_argument('--allow-partial', action='store_true', help='合并时允许缺少部分分片')
+    parser.add_argument('--dedup', action='store_true',
+                      help='检测近似重复页面（分页、排序、打印视图等变体），每组只转换一个页面，其余变体跳转到该页面')
+    parser.add_argument('--dedup-distance', type=int, default=6, help='视为近似重复的SimHash最大汉明距离，越大越激进 (default: 6)')
+    parser.add_argument('--watch', action='store_true', help='首次构建后持续监视下载目录，只重新转换变化的文件')
+    parser.add_argument('--watch-interval', type=float, default=1.0, help='监视模式的轮询间隔秒数 (default: 1.0)')
+    parser.add_argument('--watch-debounce', type=float, default=0.5,
+                      help='监视模式下变化停止多少秒后才开始重新转换，用于合并连续的修改 (default: 0.5)')
+    parser.add_argument('--from-cache', action='store_true',
+                      help='直接从httrack缓存 (hts-cache/new.zip) 顺序读取页面和响应头，未变化的页面不再重新转换')
+    parser.add_argument('--fingerprint', action='store_true',
+                      help='为CSS、脚本、图片等静态资源生成带内容哈希的文件名并改写引用，服务器对其启用长期缓存')
+    parser.add_argument('--offline', action='store_true',
+                      help='离线优化：本地化镜像中已有的外部资源，移除统计/广告脚本和外部字体，延迟其他外部脚本和样式表，图片懒加载')
+    parser.add_argument('--on-demand', action='store_true',
+                      help='按需转换模式：不预先处理文件，直接以下载目录为数据源启动服务器，页面在第一次被请求时转换')
+    parser.add_argument('--timeout', '-t', type=int, default=None,
+                      help=f'总执行时间限制，单位为秒，0表示不限制；明确指定时按价值/成本调度文件 '
+                           f'(default: {DEFAULT_TIMEOUT}，不启用调度；--watch 时默认不限制)')
+    return parser.parse_args(argv)
 
 
 def main():
@@ -48,25 +90,46 @@ def main():
         elif args.file_types == 'md-html':
             args.file_types = ['md', 'html']
 
+        # 监视模式需要在首次构建后持续运行，未明确指定 --timeout 时不设时间限制；
+        # args.timeout 保持为None，转换器只在明确指定时才按时间预算调度文件
+        timeout = args.timeout
+        if timeout is None:
+            timeout = 0 if args.watch else DEFAULT_TIMEOUT
+
+        # 延迟导入核心模块，--help 等只解析参数的调用无需加载
+        from website_converter.core import WebsiteConverter
+
+        converter = WebsiteConverter(args)
+
+        # 超时或Ctrl+C时请求转换器在文件边界上优雅停止，保存进度并生成索引；
+        # 当前阶段无法优雅停止（如服务器运行中）或再次按下Ctrl+C时直接退出
+        def interrupt_handler(signum, frame):
+            if not converter.request_stop('Ctrl+C'):
+                raise KeyboardInterrupt
+            print("\n正在停止，保存已完成的进度... (再次按 Ctrl+C 强制退出)")
+
+        signal.signal(signal.SIGINT, interrupt_handler)
+
         # 设置超时处理
-        if args.timeout > 0:
+        if timeout > 0:
             def timeout_handler(signum, frame):
-                print(f"\n超时达到 {args.timeout} 秒，程序强制停止")
-                sys.exit(1)
+                print(f"\n超时达到 {timeout} 秒，正在停止并保存进度")
+                if not converter.request_stop('超时'):
+                    print("程序强制停止")
+                    sys.exit(1)
 
             # 设置超时信号处理
             signal.signal(signal.SIGALRM, timeout_handler)
-            signal.alarm(args.timeout)
-            print(f"已设置最大执行时间为 {args.timeout} 秒")
+            signal.alarm(timeout)
+            print(f"已设置最大执行时间为 {timeout} 秒")
 
-        converter = WebsiteConverter(args)
         converter.run()
 
         # 取消超时
-        if args.timeout > 0:
+        if timeout > 0:
             signal.alarm(0)
 
-        return 0
+        return 1 if converter.stop_requested or converter.deadline_reached else 0
     except KeyboardInterrupt:
         print("\n操作被用户取消")
         return 1
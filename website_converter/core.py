@@ -6,27 +6,26 @@
 实现网站下载、转换和处理的主要功能
 """
 
+import codecs
 import os
-import sys
 import re
 import shutil
 import time
-import subprocess
-from pathlib import Path
 from datetime import datetime
-from urllib.parse import urlparse
-import socket
-import http.server
-import socketserver
-import webbrowser
-import threading
+from urllib.parse import urlparse, urlsplit, unquote
 
-try:
-    import markdown
-    MARKDOWN_AVAILABLE = True
-except ImportError:
-    MARKDOWN_AVAILABLE = False
-    print("警告: 未安装markdown库，将无法转换Markdown文件。请使用pip安装: pip install markdown")
+from website_converter.processors import markdown, build_dispatch_table
+from website_converter.writer import OutputWriter
+from website_converter.journal import RunJournal, JOURNAL_NAME
+
+# 可见文本少于该词元数的页面不做近似重复检测
+DEDUP_MIN_TOKENS = 30
+
+# 服务器常见的默认字符集：解码任何字节（或任何ASCII内容）都不会失败，声明了也不一定可信
+DEFAULT_HEADER_CHARSETS = ('iso8859-1', 'cp1252', 'ascii')
+
+# 注意: subprocess、socket、http.server等模块只在对应功能被使用时才导入，
+# 以免 --help、--no-download 等短时运行为用不到的模块付出启动开销
 
 
 class WebsiteConverter:
@@ -45,38 +44,179 @@ class WebsiteConverter:
         # 内部状态
         self.processed_count = 0
         self.total_count = 0
+        self.fast_path_count = 0
+        self.unchanged_count = 0
+        self.cache_unchanged_count = 0
+        # httrack缓存读取器与其中的HTML页面条目，保留到生成索引之后
+        self.cache_reader = None
+        self.cache_pages = []
         self.start_time = time.time()
 
+        # 输出写入器（缓存已创建目录，后台线程写入）
+        self.writer = OutputWriter(workers=args.io_threads, atomic=args.atomic_write)
+
+        # 分片设置：(序号, 总数)，None表示不分片
+        self.shard = args.shard
+        self.page_meta = {}
+
+        # 已是UTF-8的HTML文件直接在字节上处理，省去解码和重新编码
+        self.byte_fast_path = True
+        self._byte_link_patterns = None
+        self._byte_link_cache = {}
+
+        # 近似重复页面检测：每组只转换一个代表页面，变体页面跳转到代表页面
+        # 各可选功能的模块只在启用时导入
+        self.dedup = None
+        if args.dedup:
+            from website_converter.dedup import SimHashIndex
+            self.dedup = SimHashIndex(args.dedup_distance)
+        self.duplicates = {}
+        self.dedup_saved_bytes = 0
+
+        # 静态资源指纹：资源另存为带内容哈希的文件名，页面引用随之改写
+        self.fingerprints = None
+        if args.fingerprint:
+            from website_converter.fingerprint import AssetManifest
+            self.fingerprints = AssetManifest()
+
+        # 离线优化：移除或延迟外部资源请求，镜像中已有的外部资源改为站内地址
+        self.offline = None
+        self.offline_totals = None
+        if args.offline:
+            from website_converter.offline import OfflineOptimizer, new_counts
+            self.offline = OfflineOptimizer(self._resolve_external)
+            self.offline_totals = new_counts()
+        self.offline_pages = 0
+        self._external_cache = {}
+
+        # 运行日志（记录已完成文件，供 --resume 使用），每个分片使用独立的日志；
+        # 影响输出内容的选项都记入配置，选项不同时日志作废，已完成的文件按新选项重新处理
+        journal_config = {
+            'download_dir': os.path.abspath(self.download_dir),
+            'domain': self.domain,
+            'file_types': list(args.file_types),
+            'shard': list(self.shard) if self.shard else None,
+            'dedup': args.dedup,
+            'dedup_distance': args.dedup_distance if args.dedup else None,
+            'fingerprint': args.fingerprint,
+            'offline': args.offline,
+            'from_cache': args.from_cache,
+        }
+        journal_name = JOURNAL_NAME
+        if self.shard:
+            journal_name = JOURNAL_NAME.replace('.jsonl', '.shard-{}-of-{}.jsonl'.format(*self.shard))
+        self.journal = RunJournal(os.path.join(self.output_dir, journal_name), journal_config,
+                                  before_flush=self.writer.flush)
+
+        # 中断控制：超时或Ctrl+C时设置停止标志，由处理循环在文件边界上停下
+        self.phase = None
+        self.stop_requested = None
+        self._download_process = None
+
+        # 时间预算：明确指定 --timeout 时按价值/成本调度文件，并为生成索引预留时间；
+        # 未指定时（默认的时间限制只是兜底）保持原来的处理顺序
+        self.deadline = self.start_time + args.timeout if args.timeout else None
+        self.deadline_reached = False
+
+        # 监视模式与服务器状态
+        self.watcher = None
+        self.httpd = None
+        self.index_entries = {}
+
+    def request_stop(self, reason):
+        """请求优雅停止，返回False表示当前阶段无法优雅停止（调用方应直接退出）"""
+        if self.stop_requested or self.phase not in ('download', 'process', 'index', 'watch'):
+            return False
+        self.stop_requested = reason
+        if self.phase == 'download' and self._download_process is not None:
+            self._download_process.terminate()
+        return True
+
     def run(self):
         """运行完整的转换流程"""
+        if self.args.merge:
+            return self._merge_shards()
+
         print(f"开始处理网站: {self.domain}")
         print(f"下载目录: {self.download_dir}")
         print(f"输出目录: {self.output_dir}")
+        if self.shard:
+            print("分片: {}/{}".format(*self.shard))
+            if self.fingerprints is not None:
+                # 各分片互相看不到对方的资源，无法改写跨分片的引用
+                print("分片模式不支持资源指纹，已忽略 --fingerprint")
+                self.fingerprints = None
 
         # 步骤1: 如果指定URL且未禁用下载，则下载网站
+        if self.shard and self.url and not self.args.no_download:
+            print("分片模式不负责下载，请先单独完成下载，再配合 --no-download 运行各分片")
+            return False
         if self.url and not self.args.no_download:
+            self.phase = 'download'
             if not self._download_website():
-                print("下载失败，程序终止")
+                if self.stop_requested:
+                    print(f"下载被中断 ({self.stop_requested})，使用 --resume 重新运行可继续下载")
+                else:
+                    print("下载失败，程序终止")
                 return False
 
+        # 按需转换模式不预先处理文件，直接启动服务器
+        if self.args.on_demand:
+            return self._serve_on_demand()
+
+        # 监视模式在首次构建前建立快照，构建期间发生的修改也会被发现
+        if self.args.watch:
+            from website_converter.watch import TreeWatcher
+            from website_converter.htscache import CACHE_DIR_NAME
+            self.watcher = TreeWatcher(os.path.abspath(self.download_dir), ignore_dirs=(CACHE_DIR_NAME,))
+            self.watcher.snapshot()
+
         # 步骤2: 处理文件
+        self.phase = 'process'
         if not self._process_files():
             print("处理文件失败，程序终止")
             return False
 
-        # 步骤3: 创建索引页面
-        if not self._create_index_html():
+        # 步骤3: 创建索引页面（中断时只收录已完成的文件）；分片模式只输出元数据片段
+        self.phase = 'index'
+        if self.shard:
+            if not self._write_shard_fragment():
+                print("写入分片元数据失败，程序终止")
+                return False
+        elif not self._create_index_html():
             print("创建索引页面失败，程序终止")
             return False
+        self._write_asset_manifest()
+
+        # 等待后台写入完成，再刷新运行日志
+        if not self.writer.close():
+            print("警告: 部分文件写入失败")
+        self.journal.close()
+        if self.args.verbose:
+            print(f"写入统计: {self.writer.format_stats()}")
+            print(f"字节快速路径: {self.fast_path_count} 个HTML文件，其中 {self.unchanged_count} 个无需修改、原样写出")
+
+        if self.stop_requested or self.deadline_reached:
+            reason = self.stop_requested or '时间预算不足'
+            print(f"\n运行已中断 ({reason})，已完成 {len(self.journal.completed)}/{self.total_count} 个文件")
+            print("已为已完成的文件生成索引，使用 --resume 重新运行可从中断处继续")
+            self.phase = None
+            return False
 
-        # 步骤4: 如果需要，启动HTTP服务器
-        if self.args.server:
-            self._start_http_server()
+        # 步骤4: 如果需要，启动HTTP服务器（分片模式下由合并步骤之后再启动）；
+        # 监视模式下服务器在后台运行
+        self.phase = 'serve'
+        if self.args.server and not self.shard:
+            self._start_http_server(background=self.args.watch)
 
         print(f"\n处理完成! 共处理 {self.processed_count} 个文件")
         print(f"总耗时: {time.time() - self.start_time:.2f} 秒")
         print(f"输出目录: {self.output_dir}")
 
+        # 步骤5: 监视模式下持续增量更新
+        if self.args.watch and not self.shard:
+            self._watch_sources()
+
         return True
 
     def _get_domain_from_url(self, url):
@@ -90,8 +230,10 @@ class WebsiteConverter:
 
     def _check_httrack_installed(self):
         """检查httrack是否已安装"""
+        import subprocess
+
         try:
-            result = subprocess.run(['httrack', '--version'], stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+            result = subprocess.run([self.args.httrack_bin, '--version'], stdout=subprocess.PIPE, stderr=subprocess.PIPE)
             return result.returncode == 0
         except FileNotFoundError:
             return False
@@ -105,13 +247,18 @@ class WebsiteConverter:
             print("  Windows: 下载并安装 http://www.httrack.com/page/2/")
             return False
 
+        if self.args.parallel > 1:
+            return self._download_partitioned()
+
+        import subprocess
+
         print(f"开始下载网站: {self.url}")
         print(f"输出目录: {self.download_dir}")
         print(f"下载深度: {self.args.depth}")
 
         # 构建httrack命令
         cmd = [
-            'httrack', self.url,
+            self.args.httrack_bin, self.url,
             '--path', self.download_dir,
             '--depth', str(self.args.depth),
             '--quiet',
@@ -128,6 +275,10 @@ class WebsiteConverter:
         if self.args.httrack_options:
             cmd.extend(self.args.httrack_options.split())
 
+        # 恢复模式下让httrack利用缓存继续上次中断的镜像
+        if self.args.resume:
+            cmd.append('--continue')
+
         try:
             # 启动下载进程
             process = subprocess.Popen(
@@ -136,6 +287,7 @@ class WebsiteConverter:
                 stderr=subprocess.STDOUT,
                 bufsize=1
             )
+            self._download_process = process
 
             # 实时显示输出
             for line in iter(process.stdout.readline, b''):
@@ -160,7 +312,10 @@ class WebsiteConverter:
 
             # 等待进程完成
             process.wait()
+            self._download_process = None
 
+            if self.stop_requested:
+                return False
             if process.returncode == 0:
                 print("网站下载完成!")
                 return True
@@ -172,10 +327,71 @@ class WebsiteConverter:
             print(f"下载时出错: {str(e)}")
             return False
 
+    def _download_partitioned(self):
+        """并行分区下载：多个httrack进程分别抓取互不重叠的URL前缀，结束后合并到下载目录"""
+        from website_converter.partition import PartitionedDownload, plan_partitions, read_sitemap, discover_urls
+
+        print(f"开始并行下载网站: {self.url}")
+        print(f"输出目录: {self.download_dir}")
+
+        # 分区依据：手工指定的前缀 > 站点地图 > 入口页面中的链接
+        prefixes = [p.strip() for p in self.args.partitions.split(',') if p.strip()] if self.args.partitions else None
+        urls = None
+        if not prefixes:
+            try:
+                if self.args.sitemap:
+                    urls = read_sitemap(self.args.sitemap)
+                    print(f"站点地图中共 {len(urls)} 个URL")
+                else:
+                    urls = discover_urls(self.url)
+                    print(f"入口页面中共 {len(urls)} 个链接")
+            except Exception as e:
+                print(f"读取分区依据时出错: {str(e)}")
+                urls = []
+        partitions = plan_partitions(self.url, self.args.parallel, prefixes, urls)
+        if len(partitions) < self.args.parallel:
+            print(f"只找到足够划分 {len(partitions)} 个分区的路径前缀")
+
+        # 与单进程下载相同的附加选项
+        options = []
+        if self.args.limit:
+            options.extend(['--max-files', str(self.args.limit), '--timeout', '60'])
+        if self.args.httrack_options:
+            options.extend(self.args.httrack_options.split())
+
+        driver = PartitionedDownload(
+            self.url, partitions, self.download_dir,
+            work_root=self.download_dir.rstrip('/\\') + '_parts',
+            depth=self.args.depth, sockets=self.args.sockets, extra_options=options,
+            httrack=self.args.httrack_bin, resume=self.args.resume,
+        )
+        self._download_process = driver
+        try:
+            ok = driver.run()
+        except Exception as e:
+            print(f"下载时出错: {str(e)}")
+            driver.terminate()
+            return False
+        finally:
+            self._download_process = None
+
+        # 中断时不合并，--resume 重新运行时各分区会继续下载后再合并
+        if self.stop_requested:
+            return False
+
+        stats = driver.merge()
+        print(f"合并到下载目录: 硬链接 {stats['linked']} 个、复制 {stats['copied']} 个文件；重叠文件中 "
+              f"{stats['identical']} 个内容相同，{stats['replaced']} 个按归属分区替换，{stats['kept']} 个保留原版本")
+        if ok:
+            print("网站下载完成!")
+        else:
+            print("部分分区下载失败，已合并下载成功的文件")
+        return ok
+
     def _safe_mkdir(self, directory):
         """安全地创建目录"""
         try:
-            os.makedirs(directory, exist_ok=True)
+            self.writer.ensure_dir(directory)
             return True
         except Exception as e:
             print(f"创建目录时出错: {str(e)}")
@@ -221,8 +437,8 @@ class WebsiteConverter:
                         lambda m: f'src="{self._ensure_html_extension(m.group(1))}"',
                         content)
 
-        # 修复绝对路径链接（添加域名目录前缀）
-        content = re.sub(r'(href|src)=[\'"]/((?!{domain}).+?)[\'"]'.format(domain=re.escape(self.domain)),
+        # 修复绝对路径链接（添加域名目录前缀，协议相对的 //host/ 链接除外）
+        content = re.sub(r'(href|src)=[\'"]/((?!{domain})(?!/).+?)[\'"]'.format(domain=re.escape(self.domain)),
                         rf'\1="/{self.domain}/\2"',
                         content)
 
@@ -231,8 +447,174 @@ class WebsiteConverter:
                          rf'\1="/{self.domain}/\2"',
                          content)
 
+        # 已登记指纹的静态资源改用带哈希的文件名
+        if self.fingerprints is not None and self.fingerprints.assets:
+            content = re.sub(r'(href|src)="(/{domain}/[^"]+)"'.format(domain=re.escape(self.domain)),
+                             lambda m: f'{m.group(1)}="{self._asset_url(m.group(2))}"',
+                             content)
+
+        return content
+
+    def _fix_links_in_bytes(self, content):
+        """修复UTF-8字节内容中的链接，规则与 _fix_links_in_content 相同"""
+        if self._byte_link_patterns is None:
+            domain = self.domain.encode('utf-8')
+            self._byte_link_patterns = (
+                re.compile(rb'href=[\'"]([^\'"]+)[\'"]'),
+                re.compile(rb'src=[\'"]([^\'"]+)[\'"]'),
+                re.compile(rb'(href|src)=[\'"]/((?!' + re.escape(domain) + rb')(?!/).+?)[\'"]'),
+                re.compile(rb'(href|src)=[\'"](?!http|https|ftp|mailto|tel|#|/|javascript)([^\'"]+)[\'"]'),
+                rb'\1="/' + domain.replace(b'\\', b'\\\\') + rb'/\2"',
+            )
+        href_re, src_re, absolute_re, relative_re, prefix_repl = self._byte_link_patterns
+
+        # 引号是ASCII字符，捕获组总落在完整的UTF-8字符边界上，可以安全解码；
+        # 同一站点的页面大量共享链接，按原始字节缓存改写结果
+        cache = self._byte_link_cache
+        if len(cache) > 100000:
+            cache.clear()
+
+        def fix(attr):
+            def replace(m):
+                url = m.group(1)
+                fixed = cache.get(url)
+                if fixed is None:
+                    fixed = cache[url] = self._ensure_html_extension(url.decode('utf-8')).encode('utf-8')
+                return attr + b'="' + fixed + b'"'
+            return replace
+
+        content = href_re.sub(fix(b'href'), content)
+        content = src_re.sub(fix(b'src'), content)
+        content = absolute_re.sub(prefix_repl, content)
+        content = relative_re.sub(prefix_repl, content)
+
+        if self.fingerprints is not None and self.fingerprints.assets:
+            content = re.sub(rb'(href|src)="(/' + re.escape(self.domain.encode('utf-8')) + rb'/[^"]+)"',
+                             lambda m: m.group(1) + b'="' + self._asset_url(m.group(2).decode('utf-8')).encode('utf-8') + b'"',
+                             content)
+        return content
+
+    def _asset_url(self, url):
+        """站点内资源的URL，启用指纹且资源已登记时返回带内容哈希的URL
+
+        url可以是站点内相对路径（如 static/index.css）或 /域名/ 开头的绝对路径
+        """
+        prefix = f'/{self.domain}/'
+        if not url.startswith(prefix):
+            url = prefix + url
+        if self.fingerprints is not None:
+            fingerprinted = self.fingerprints.lookup(url[len(prefix):])
+            if fingerprinted is not None:
+                return prefix + fingerprinted
+        return url
+
+    def _is_utf8(self, raw_content):
+        """检查字节内容是否为合法的UTF-8（纯ASCII时无需解码）"""
+        try:
+            if raw_content.isascii():
+                return True
+        except AttributeError:
+            # Python 3.6 没有 bytes.isascii()
+            pass
+        try:
+            raw_content.decode('utf-8')
+            return True
+        except UnicodeDecodeError:
+            return False
+
+    def _header_charset(self, raw_content, charset):
+        """返回值得优先尝试的响应头字符集，不可信时返回None（按UTF-8优先的默认顺序猜测）
+
+        响应头的字符集总是优先（很短的GBK内容也可能恰好是合法UTF-8）。例外是页面内
+        <meta charset> 与响应头不符，或响应头声明的是服务器默认的单字节字符集而内容是合法UTF-8。
+        """
+        if not charset or charset == 'utf-8':
+            return None
+        if charset in DEFAULT_HEADER_CHARSETS and self._is_utf8(raw_content):
+            return None
+        meta = re.search(rb'<meta[^>]*charset=["\']?([A-Za-z0-9_.:-]+)', raw_content[:4096], re.IGNORECASE)
+        if meta:
+            try:
+                if codecs.lookup(meta.group(1).decode('ascii')).name != charset:
+                    return None
+            except LookupError:
+                pass
+        return charset
+
+    def _fix_html_bytes(self, raw_content, html_file_path):
+        """在UTF-8字节上修复编码声明和链接
+
+        返回修复后的字节；需要补全HTML结构的文件返回None，交给文本路径处理
+        """
+        if not re.search(rb'<html', raw_content, re.IGNORECASE):
+            return None
+
+        # 修复HTML编码声明
+        content = re.sub(rb'<meta[^>]*charset=["\']?([^"\'>]*)["\']?[^>]*>', b'<meta charset="utf-8">',
+                         raw_content)
+
+        # 如果没有编码声明，添加一个
+        if b'charset=' not in content and b'<head' in content:
+            content = content.replace(b'<head>', b'<head>\n    <meta charset="utf-8">')
+
+        # 修复链接
+        content = self._fix_links_in_bytes(content)
+
+        if self.shard is not None or self.cache_reader is not None:
+            self._record_page_meta(content, html_file_path)
         return content
 
+    def _record_page_meta(self, content, file_path):
+        """记录页面标题（从httrack缓存读取时供索引使用）及分片合并所需的链接，content为str或合法的UTF-8字节"""
+        meta = self.page_meta.setdefault(file_path, {})
+        if isinstance(content, bytes):
+            match = re.search(rb'<title>(.*?)</title>', content) or re.search(rb'<h1[^>]*>(.*?)</h1>', content)
+            meta['title'] = match.group(1).decode('utf-8') if match else self._get_title_from_html('', file_path)
+            if self.shard is not None:
+                links = [link.decode('utf-8') for link in re.findall(rb'href="(/[^"#?]*)', content)]
+                meta['links'] = list(dict.fromkeys(links))
+        else:
+            meta['title'] = self._get_title_from_html(content, file_path)
+            if self.shard is not None:
+                meta['links'] = list(dict.fromkeys(re.findall(r'href="(/[^"#?]*)', content)))
+
+    def _redirect_duplicate(self, text, html_file_path, output_path, size):
+        """检查页面是否为已转换页面的近似重复，是则写出跳转页面并返回True"""
+        from website_converter.dedup import visible_text, tokenize, simhash
+
+        tokens = tokenize(visible_text(text))
+        if len(tokens) < DEDUP_MIN_TOKENS:
+            return False  # 文本太少时指纹不可靠
+
+        fingerprint = simhash(tokens)
+        rel_path = os.path.relpath(html_file_path, self.download_dir)
+        canonical = self.dedup.add(rel_path, fingerprint)
+        meta = self.page_meta.setdefault(html_file_path, {})
+        if canonical == rel_path:
+            meta['simhash'] = fingerprint
+            return False
+
+        meta['duplicate_of'] = canonical
+        self.duplicates[rel_path] = canonical
+        self.dedup_saved_bytes += size
+
+        target = '/' + self.domain + '/' + canonical.replace(os.sep, '/')
+        self.writer.write(output_path, f"""<!DOCTYPE html>
+<html lang="zh-CN">
+<head>
+    <meta charset="utf-8">
+    <link rel="canonical" href="{target}">
+    <meta http-equiv="refresh" content="0;url={target}">
+    <title>正在跳转...</title>
+</head>
+<body>
+    <p>此页面与 <a href="{target}">{target}</a> 内容相近，正在跳转...</p>
+</body>
+</html>
+""")
+        print(f"近似重复页面: {os.path.basename(html_file_path)} -> {canonical}")
+        return True
+
     def _get_title_from_md(self, md_content):
         """从Markdown内容提取标题"""
         lines = md_content.strip().split('\n')
@@ -243,9 +625,20 @@ class WebsiteConverter:
         # 如果没有找到一级标题，返回默认标题
         return "Markdown页面"
 
-    def _convert_md_to_html(self, md_file_path, output_path):
-        """将Markdown文件转换为HTML"""
-        if not MARKDOWN_AVAILABLE:
+    def _get_title_from_html(self, content, file_path):
+        """从HTML内容提取标题，依次使用<title>、第一个<h1>和文件名"""
+        title_match = re.search(r'<title>(.*?)</title>', content)
+        if title_match:
+            return title_match.group(1)
+        h1_match = re.search(r'<h1[^>]*>(.*?)</h1>', content)
+        if h1_match:
+            return h1_match.group(1)
+        filename = os.path.basename(file_path)
+        return os.path.splitext(filename)[0].replace('-', ' ').replace('_', ' ').title()
+
+    def _convert_md_to_html(self, md_file_path, output_path, content=None, charset=None):
+        """将Markdown文件转换为HTML，content为已读取的字节内容时不再读取文件"""
+        if not markdown.available():
             print(f"跳过Markdown转换: {md_file_path} (未安装markdown库)")
             return False
 
@@ -253,20 +646,31 @@ class WebsiteConverter:
             # 读取Markdown内容
             md_content = None
 
-            # 尝试多种编码读取文件
-            for encoding in ['utf-8', 'gbk', 'gb2312', 'iso-8859-1']:
-                try:
-                    with open(md_file_path, 'r', encoding=encoding) as f:
-                        md_content = f.read()
-                    break
-                except UnicodeDecodeError:
-                    continue
+            if content is not None:
+                # 响应头的字符集可信时优先使用，再尝试常见编码
+                charset = self._header_charset(content, charset)
+                encodings = [charset] if charset else []
+                for encoding in encodings + ['utf-8', 'gbk', 'gb2312', 'iso-8859-1']:
+                    try:
+                        md_content = content.decode(encoding).replace('\r\n', '\n')
+                        break
+                    except UnicodeDecodeError:
+                        continue
+            else:
+                # 尝试多种编码读取文件
+                for encoding in ['utf-8', 'gbk', 'gb2312', 'iso-8859-1']:
+                    try:
+                        with open(md_file_path, 'r', encoding=encoding) as f:
+                            md_content = f.read()
+                        break
+                    except UnicodeDecodeError:
+                        continue
 
-            # 如果所有编码都失败，使用替换错误的方式
-            if md_content is None:
-                with open(md_file_path, 'r', encoding='utf-8', errors='replace') as f:
-                    md_content = f.read()
-                print(f"警告: 文件 {md_file_path} 使用了不标准的编码，可能存在乱码")
+                # 如果所有编码都失败，使用替换错误的方式
+                if md_content is None:
+                    with open(md_file_path, 'r', encoding='utf-8', errors='replace') as f:
+                        md_content = f.read()
+                    print(f"警告: 文件 {md_file_path} 使用了不标准的编码，可能存在乱码")
 
             # 提取标题
             title = self._get_title_from_md(md_content)
@@ -281,7 +685,7 @@ class WebsiteConverter:
     <meta charset="UTF-8">
     <meta name="viewport" content="width=device-width, initial-scale=1.0">
     <title>{title}</title>
-    <link rel="stylesheet" href="/{self.domain}/static/index.css">
+    <link rel="stylesheet" href="{self._asset_url('static/index.css')}">
     <style>
         body {{
             font-family: -apple-system, BlinkMacSystemFont, "Segoe UI", Roboto, Helvetica, Arial, sans-serif;
@@ -319,36 +723,80 @@ class WebsiteConverter:
 </body>
 </html>"""
 
-            # 确保输出目录存在
-            os.makedirs(os.path.dirname(output_path), exist_ok=True)
-
             # 写入HTML文件
-            with open(output_path, 'w', encoding='utf-8') as f:
-                f.write(html_doc)
+            self.writer.write(output_path, html_doc)
 
             return True
         except Exception as e:
             print(f"转换Markdown文件时出错: {md_file_path}\n{str(e)}")
             return False
 
-    def _fix_html_file(self, html_file_path, output_path):
-        """修复HTML文件中的链接问题"""
+    def _copy_file(self, src_path, output_path, content=None, charset=None):
+        """直接复制文件，content为已读取的内容时直接写出
+
+        启用指纹时静态资源另外写出一份带内容哈希的文件；原文件名同样保留，
+        供改写不到的引用（srcset、CSS中的url()、脚本拼接的路径等）使用
+        """
+        if self.fingerprints is not None and self.fingerprints.is_asset(output_path):
+            if content is None:
+                with open(src_path, 'rb') as f:
+                    content = f.read()
+            domain_dir = os.path.join(self.output_dir, self.domain)
+            fingerprinted = self.fingerprints.add(os.path.relpath(output_path, domain_dir), content)
+            self.writer.write(os.path.join(domain_dir, fingerprinted), content)
+            self.page_meta.setdefault(src_path, {})['fingerprint'] = fingerprinted
+
+        if content is not None:
+            self.writer.write(output_path, content)
+        else:
+            self.writer.copy(src_path, output_path)
+        return True
+
+    def _fix_html_file(self, html_file_path, output_path, content=None, charset=None):
+        """修复HTML文件中的链接问题
+
+        content为已读取的字节内容时不再读取文件；charset为响应头记录的字符集，可信时优先使用
+        """
         try:
             # 读取HTML内容
             html_content = None
             detected_encoding = None
 
             # 使用二进制模式读取文件，以便进行编码检测
-            with open(html_file_path, 'rb') as f:
-                raw_content = f.read()
+            if content is not None:
+                raw_content = content
+            else:
+                with open(html_file_path, 'rb') as f:
+                    raw_content = f.read()
+
+            # 快速路径：已是UTF-8（无BOM）的文件直接在字节上替换，没有任何改动时原样写出
+            charset = self._header_charset(raw_content, charset)
+            dedup_checked = False
+            if self.byte_fast_path and self.offline is None and charset is None and not raw_content.startswith(b'\xef\xbb\xbf') \
+                    and self._is_utf8(raw_content):
+                if self.dedup is not None:
+                    dedup_checked = True
+                    if self._redirect_duplicate(raw_content.decode('utf-8'), html_file_path,
+                                                output_path, len(raw_content)):
+                        return True
+                fixed_bytes = self._fix_html_bytes(raw_content, html_file_path)
+                if fixed_bytes is not None:
+                    unchanged = fixed_bytes == raw_content
+                    self.writer.write(output_path, raw_content if unchanged else fixed_bytes)
+                    self.fast_path_count += 1
+                    self.unchanged_count += unchanged
+                    note = '，内容无需修改' if unchanged else ''
+                    print(f"成功处理文件: {os.path.basename(html_file_path)} (原编码: utf-8，字节快速路径{note})")
+                    return True
 
             # 检测编码（如果内容以BOM开头，直接处理）
             if raw_content.startswith(b'\xef\xbb\xbf'):  # UTF-8 BOM
                 html_content = raw_content[3:].decode('utf-8')
                 detected_encoding = 'utf-8-sig'
             else:
-                # 尝试多种编码
-                for encoding in ['utf-8', 'gbk', 'gb2312', 'gb18030', 'big5', 'iso-8859-1']:
+                # 尝试多种编码（响应头记录的字符集可信时优先使用）
+                encodings = [charset] if charset else []
+                for encoding in encodings + ['utf-8', 'gbk', 'gb2312', 'gb18030', 'big5', 'iso-8859-1']:
                     try:
                         html_content = raw_content.decode(encoding)
                         detected_encoding = encoding
@@ -362,6 +810,11 @@ class WebsiteConverter:
                 detected_encoding = 'utf-8 (with replacement)'
                 print(f"警告: 文件 {html_file_path} 使用了不标准的编码，使用替换字符处理")
 
+            # 近似重复页面只写出跳转页面
+            if self.dedup is not None and not dedup_checked and \
+                    self._redirect_duplicate(html_content, html_file_path, output_path, len(raw_content)):
+                return True
+
             # 修复HTML编码声明
             html_content = re.sub(
                 r'<meta[^>]*charset=["\']?([^"\'>]*)["\']?[^>]*>',
@@ -373,23 +826,21 @@ class WebsiteConverter:
             if 'charset=' not in html_content and '<head' in html_content:
                 html_content = html_content.replace('<head>', '<head>\n    <meta charset="utf-8">')
 
+            # 离线优化外部资源（在链接修复之前，本地化后的站内地址不会再被改写）
+            if self.offline is not None:
+                html_content = self._optimize_offline(html_content, html_file_path)
+
             # 修复链接
             fixed_content = self._fix_links_in_content(html_content)
 
+            # 分片模式下记录页面元数据，供合并步骤生成索引；从httrack缓存读取时记录标题，索引无需再读取文件
+            if self.shard is not None or self.cache_reader is not None:
+                self._record_page_meta(fixed_content, html_file_path)
+
             # 如果文件没有完整的HTML结构，添加基本的HTML结构
             if "<html" not in fixed_content.lower():
-                # 尝试提取标题
-                title_match = re.search(r'<title>(.*?)</title>', fixed_content)
-                h1_match = re.search(r'<h1[^>]*>(.*?)</h1>', fixed_content)
-
-                if title_match:
-                    title = title_match.group(1)
-                elif h1_match:
-                    title = h1_match.group(1)
-                else:
-                    # 使用文件名作为标题
-                    filename = os.path.basename(html_file_path)
-                    title = os.path.splitext(filename)[0].replace('-', ' ').replace('_', ' ').title()
+                # 提取标题
+                title = self._get_title_from_html(fixed_content, html_file_path)
 
                 # 创建完整的HTML结构
                 fixed_content = f"""<!DOCTYPE html>
@@ -398,7 +849,7 @@ class WebsiteConverter:
     <meta charset="utf-8">
     <meta name="viewport" content="width=device-width, initial-scale=1.0">
     <title>{title}</title>
-    <link rel="stylesheet" href="/{self.domain}/static/index.css">
+    <link rel="stylesheet" href="{self._asset_url('static/index.css')}">
 </head>
 <body>
     <div class="container">
@@ -413,12 +864,8 @@ class WebsiteConverter:
 </body>
 </html>"""
 
-            # 确保输出目录存在
-            os.makedirs(os.path.dirname(output_path), exist_ok=True)
-
             # 写入修复后的HTML文件，统一使用UTF-8编码
-            with open(output_path, 'w', encoding='utf-8') as f:
-                f.write(fixed_content)
+            self.writer.write(output_path, fixed_content)
 
             print(f"成功处理文件: {os.path.basename(html_file_path)} (原编码: {detected_encoding} -> UTF-8)")
             return True
@@ -429,9 +876,32 @@ class WebsiteConverter:
     def _process_files(self):
         """处理输入目录中的文件"""
         try:
-            # 清空并重建输出目录
-            self._safe_rmtree(self.output_dir)
+            # 恢复模式下读取运行日志，否则清空并重建输出目录
+            completed = self.journal.load() if self.args.resume else None
+            if completed is not None:
+                print(f"从运行日志恢复: 已完成 {len(completed)} 个文件")
+                # 恢复已完成页面的近似重复检测状态
+                if self.dedup is not None:
+                    for rel_path, meta in self.journal.metadata.items():
+                        if 'duplicate_of' in meta:
+                            self.duplicates[rel_path] = meta['duplicate_of']
+                        elif 'simhash' in meta:
+                            self.dedup.add(rel_path, meta['simhash'])
+                # 恢复已复制资源的指纹，后续页面仍可改写对它们的引用
+                if self.fingerprints is not None:
+                    for rel_path, meta in self.journal.metadata.items():
+                        if 'fingerprint' in meta:
+                            self.fingerprints.restore(rel_path, meta['fingerprint'])
+            else:
+                if self.args.resume:
+                    print("未找到可用的运行日志（日志不存在或运行选项已改变），将重新处理所有文件")
+                completed = set()
+                # 分片共享输出目录，不能清空其他分片的结果；
+                # 从httrack缓存读取时保留上次的输出，未变化的页面不再重新转换
+                if not self.shard and not self.args.from_cache:
+                    self._safe_rmtree(self.output_dir)
             self._safe_mkdir(self.output_dir)
+            self.journal.open(resume=bool(completed))
 
             # 创建域名目录
             domain_dir = os.path.join(self.output_dir, self.domain)
@@ -441,58 +911,128 @@ class WebsiteConverter:
             static_dir = os.path.join(domain_dir, 'static')
             self._safe_mkdir(static_dir)
 
-            # 创建默认CSS文件
-            self._create_default_css()
+            # 创建默认CSS文件（分片模式下由合并步骤创建）
+            if not self.shard:
+                self._create_default_css()
 
-            # 扫描文件
+            # 扫描文件：优先从httrack缓存压缩包中顺序读取，每项为 (文件路径, 相对路径, 缓存条目)
             input_dir = self.download_dir
             file_list = []
+            cache_reader = None
 
-            for root, _, files in os.walk(input_dir):
-                for file in files:
-                    file_path = os.path.join(root, file)
-                    rel_path = os.path.relpath(file_path, input_dir)
-                    file_list.append((file_path, rel_path))
+            if self.args.from_cache:
+                from website_converter import htscache
+                cache_zip = htscache.find_cache_zip(input_dir)
+                if cache_zip is None:
+                    print(f"未找到httrack缓存 {os.path.join(htscache.CACHE_DIR_NAME, htscache.CACHE_ZIP_NAME)}，改为遍历下载目录")
+                else:
+                    cache_reader = self.cache_reader = htscache.HtsCacheReader(cache_zip, input_dir).open()
+                    for entry in cache_reader.entries():
+                        file_list.append((os.path.join(input_dir, entry.rel_path), entry.rel_path, entry))
+                    self.cache_pages = [item for item in file_list if self._is_index_page(item[1])]
+                    stats = cache_reader.stats
+                    print(f"从httrack缓存读取: {stats['entries']} 个条目，跳过 {stats['skipped_status']} 个错误响应、"
+                          f"{stats['skipped_path']} 个未保存到下载目录的条目")
+
+            if cache_reader is None:
+                from website_converter.htscache import CACHE_DIR_NAME
+                for root, dirs, files in os.walk(input_dir):
+                    # httrack的缓存目录不是网站内容
+                    if CACHE_DIR_NAME in dirs:
+                        dirs.remove(CACHE_DIR_NAME)
+                    for file in files:
+                        file_path = os.path.join(root, file)
+                        rel_path = os.path.relpath(file_path, input_dir)
+                        file_list.append((file_path, rel_path, None))
+
+            # 分片模式下只保留按路径哈希分到本分片的文件
+            if self.shard:
+                from website_converter import shard
+                index, total = self.shard
+                found = len(file_list)
+                file_list = [item for item in file_list if shard.shard_of(item[1], total) == index]
+                print(f"分片 {index}/{total}: 共 {found} 个文件，本分片处理 {len(file_list)} 个")
 
             self.total_count = len(file_list)
             print(f"找到 {self.total_count} 个文件")
 
+            # 构建扩展名 -> 处理器分派表
+            dispatch, default_processor = build_dispatch_table(self.args.file_types)
+
+            # 受时间或数量限制时按价值/成本排序，限制保留的是最有价值的文件而不是最先遍历到的文件；
+            # 没有处理器的文件（如只转换md-html时的图片）不参与调度
+            scheduler = None
+            if self.args.limit or self.deadline is not None:
+                file_list = [item for item in file_list
+                             if dispatch.get(os.path.splitext(item[1])[1].lower(), default_processor) is not None]
+                if len(file_list) < self.total_count:
+                    print(f"其中 {len(file_list)} 个文件需要处理")
+                    self.total_count = len(file_list)
+                from website_converter.schedule import DeadlineScheduler
+                scheduler = DeadlineScheduler(self.deadline)
+                file_list = self._schedule_files(scheduler, file_list, cache_reader)
+
             # 如果设置了限制，截取列表
             if self.args.limit:
                 file_list = file_list[:self.args.limit]
-                print(f"由于限制，将只处理前 {self.args.limit} 个文件")
+                print(f"由于限制，将只处理得分最高的 {self.args.limit} 个文件")
+
+            if scheduler is not None and self.deadline is not None:
+                budget = self.deadline - time.time()
+                reserve = scheduler.reserve_index(file_list, budget)
+                print(f"剩余时间预算 {budget:.1f} 秒，其中为生成索引预留 {reserve:.1f} 秒")
+
+            # 启用指纹时先处理静态资源，页面处理时即可直接改写对它们的引用，无需再扫描一遍
+            if self.fingerprints is not None:
+                file_list.sort(key=lambda item: not self.fingerprints.is_asset(item[1]))
 
             # 处理文件
-            for file_path, rel_path in file_list:
+            for file_path, rel_path, entry in file_list:
+                if self.stop_requested:
+                    print(f"收到停止请求 ({self.stop_requested})，停止处理剩余文件")
+                    break
+
                 try:
                     self.processed_count += 1
 
+                    # 上次运行已完成的文件
+                    if rel_path in completed:
+                        continue
+
                     # 计算输出路径
                     output_path = os.path.join(domain_dir, rel_path)
 
-                    # 确保输出目录存在
-                    os.makedirs(os.path.dirname(output_path), exist_ok=True)
-
-                    # 根据文件类型进行处理
-                    if rel_path.lower().endswith('.md') and ('md-only' in self.args.file_types or 'md-html' in self.args.file_types or 'all' in self.args.file_types):
-                        # 将.md改为.html
-                        output_path = os.path.splitext(output_path)[0] + '.html'
-                        # 转换Markdown为HTML
-                        self._convert_md_to_html(file_path, output_path)
-                        if self.args.verbose:
-                            print(f"[{self.processed_count}/{self.total_count}] 转换MD: {rel_path}")
-
-                    elif rel_path.lower().endswith(('.html', '.htm')) and ('html-only' in self.args.file_types or 'md-html' in self.args.file_types or 'all' in self.args.file_types):
-                        # 修复HTML文件链接
-                        self._fix_html_file(file_path, output_path)
-                        if self.args.verbose:
-                            print(f"[{self.processed_count}/{self.total_count}] 修复HTML: {rel_path}")
-
-                    elif 'all' in self.args.file_types:
-                        # 直接复制其他文件
-                        shutil.copy2(file_path, output_path)
+                    # 按扩展名查表分派处理器
+                    ext = os.path.splitext(rel_path)[1].lower()
+                    processor = dispatch.get(ext, default_processor)
+                    if processor is not None:
+                        # 剩余时间不够处理该文件时跳过，继续尝试更小的文件
+                        if scheduler is not None and not scheduler.fits(rel_path):
+                            if not self.deadline_reached:
+                                print("剩余时间不足，开始跳过来不及处理的文件")
+                                self.deadline_reached = True
+                            continue
+                        started = time.time()
+
+                        output_path = processor.output_path(output_path)
+
+                        # 缓存条目使用记录的内容和字符集；304（未变化）且已有输出的条目直接跳过
+                        content = charset = None
+                        if entry is not None:
+                            if entry.status == 304 and os.path.exists(output_path):
+                                self.cache_unchanged_count += 1
+                                continue
+                            content = cache_reader.read(entry)
+                            charset = entry.charset
+
+                        # 写入任务带上源文件标记，后台写入失败的文件不会记入运行日志
+                        self.writer.tag = rel_path
+                        if processor.process(self, file_path, output_path, content, charset):
+                            self.journal.record(rel_path, self.page_meta.pop(file_path, None))
+                        if scheduler is not None:
+                            scheduler.observe(rel_path, time.time() - started)
                         if self.args.verbose:
-                            print(f"[{self.processed_count}/{self.total_count}] 复制: {rel_path}")
+                            print(f"[{self.processed_count}/{self.total_count}] {processor.label}: {rel_path}")
 
                     # 定期显示进度
                     if not self.args.verbose and self.processed_count % 50 == 0:
@@ -503,12 +1043,105 @@ class WebsiteConverter:
                 except Exception as e:
                     print(f"处理文件时出错: {rel_path}\n{str(e)}")
 
+            self.writer.tag = None
+
+            if cache_reader is not None:
+                print(f"httrack缓存中未变化、跳过转换的文件: {self.cache_unchanged_count} 个")
+
+            if scheduler is not None and scheduler.skipped:
+                print(f"时间预算不足，跳过 {scheduler.skipped} 个文件（其中页面 {scheduler.skipped_pages} 个），"
+                      f"使用 --resume 重新运行可继续处理")
+
+            if self.dedup is not None:
+                self._print_dedup_stats()
+            if self.offline is not None:
+                self._print_offline_stats()
+
             return True
 
         except Exception as e:
             print(f"处理文件时出错: {str(e)}")
             return False
 
+    def _schedule_files(self, scheduler, file_list, cache_reader=None):
+        """读取入口页面的链接，按价值/成本对文件列表排序"""
+        from website_converter.schedule import find_entry_page, entry_links
+
+        def size_of(item):
+            file_path, _, entry = item
+            if entry is not None and entry.in_cache:
+                return entry.info.file_size
+            try:
+                return os.path.getsize(file_path)
+            except OSError:
+                return 0
+
+        entry_rel, site_root = find_entry_page((item[1] for item in file_list), self.domain,
+                                               urlparse(self.url).path if self.url else '')
+        links = set()
+        if entry_rel is not None:
+            try:
+                item = next(item for item in file_list if item[1].replace(os.sep, '/') == entry_rel)
+                content = cache_reader.read(item[2]) if item[2] is not None else None
+                if content is None:
+                    with open(item[0], 'rb') as f:
+                        content = f.read()
+                links = entry_links(content.decode('utf-8', errors='replace'), entry_rel, site_root)
+                links.add(entry_rel)
+            except Exception as e:
+                print(f"读取入口页面时出错: {entry_rel} - {str(e)}")
+        ordered = scheduler.order(file_list, size_of, links, site_root)
+        print(f"按价值/成本调度文件: 入口页面 {entry_rel or '未找到'}，入口页面链接的站内文件 {len(links)} 个")
+        return ordered
+
+    def _resolve_external(self, url):
+        """外部资源已在下载目录中时（httrack按 域名/路径 保存）返回站内URL，否则返回None"""
+        if url in self._external_cache:
+            return self._external_cache[url]
+        parts = urlsplit('https:' + url if url.startswith('//') else url)
+        host = (parts.hostname or '').lower()
+        path = unquote(parts.path).lstrip('/')
+        local = None
+        if host and path:
+            candidates = [host + '/' + path]
+            if host in (self.domain, 'www.' + self.domain):
+                candidates.append(path)
+            for rel_path in candidates:
+                rel_path = os.path.normpath(rel_path)
+                if not rel_path.startswith('..') and os.path.isfile(os.path.join(self.download_dir, rel_path)):
+                    local = '/' + self.domain + '/' + rel_path.replace(os.sep, '/')
+                    break
+        self._external_cache[url] = local
+        return local
+
+    def _optimize_offline(self, html_content, html_file_path):
+        """离线优化页面的外部资源引用，并输出本页的统计"""
+        html_content, counts = self.offline.optimize(html_content)
+        for key, value in counts.items():
+            self.offline_totals[key] += value
+        if counts['removed'] or counts['deferred'] or counts['localized']:
+            self.offline_pages += 1
+            print(f"离线优化: {os.path.basename(html_file_path)} 移除阻塞请求 {counts['removed']} 个，"
+                  f"延迟加载 {counts['deferred']} 个，本地化 {counts['localized']} 个，"
+                  f"移除连接提示 {counts['hints']} 个，图片懒加载 {counts['lazy_images']} 个")
+        return html_content
+
+    def _print_offline_stats(self):
+        """输出离线优化的汇总统计"""
+        totals = self.offline_totals
+        print(f"离线优化: {self.offline_pages} 个页面共移除阻塞请求 {totals['removed']} 个，"
+              f"延迟加载 {totals['deferred']} 个，本地化外部资源 {totals['localized']} 个，"
+              f"移除连接提示 {totals['hints']} 个，图片懒加载 {totals['lazy_images']} 个")
+
+    def _print_dedup_stats(self):
+        """输出近似重复页面的聚类统计"""
+        stats = self.dedup.stats()
+        print(f"近似重复检测: {stats['pages']} 个页面分为 {stats['clusters']} 组，"
+              f"其中 {stats['duplicate_clusters']} 组含变体，共跳过 {len(self.duplicates)} 个变体页面 "
+              f"(源文件 {self.dedup_saved_bytes / 1024:.1f} KB)，指纹比较 {stats['comparisons']} 次")
+        for canonical, count in stats['largest']:
+            print(f"    {canonical}: {count} 个变体")
+
     def _create_default_css(self):
         """创建默认CSS文件"""
         css_path = os.path.join(self.output_dir, self.domain, 'static', 'index.css')
@@ -659,84 +1292,127 @@ a:hover {
 }
 """
         try:
-            with open(css_path, 'w', encoding='utf-8') as f:
-                f.write(css_content.strip())
+            self.writer.write(css_path, css_content.strip())
+            if self.fingerprints is not None:
+                css_bytes = css_content.strip().encode('utf-8')
+                fingerprinted = self.fingerprints.add('static/index.css', css_bytes)
+                self.writer.write(os.path.join(self.output_dir, self.domain, fingerprinted), css_bytes)
             return True
         except Exception as e:
             print(f"创建CSS文件时出错: {str(e)}")
             return False
 
+    def _make_index_entry(self, rel_path, title):
+        """根据相对路径和标题构建索引条目，分类取第一级目录名"""
+        parts = rel_path.replace(os.sep, '/').split('/')
+        category = parts[0] if len(parts) > 1 else "其他"
+
+        # 构建网站内的相对路径
+        web_path = '/' + self.domain + '/' + rel_path
+
+        return {
+            'path': web_path,
+            'title': title,
+            'category': category
+        }
+
+    def _is_index_page(self, rel_path):
+        """是否为收录进索引的页面（各目录的 index.html 除外）"""
+        file = os.path.basename(rel_path)
+        return file.endswith(('.html', '.htm')) and file != 'index.html'
+
+    def _read_index_entry(self, file_path, rel_path, raw_content=None, charset=None):
+        """读取源文件标题，构建索引条目；raw_content为已读取的字节内容（如httrack缓存条目）时不再读取文件"""
+        file = os.path.basename(file_path)
+        try:
+            content = None
+            if raw_content is None:
+                with open(file_path, 'rb') as f:
+                    raw_content = f.read()
+
+            # 尝试多种编码解码（响应头记录的字符集可信时优先使用）
+            charset = self._header_charset(raw_content, charset)
+            encodings = [charset] if charset else []
+            for encoding in encodings + ['utf-8', 'gbk', 'gb2312', 'iso-8859-1']:
+                try:
+                    content = raw_content.decode(encoding)
+                    break
+                except UnicodeDecodeError:
+                    continue
+
+            # 如果所有编码都失败，使用替换错误的方式
+            if content is None:
+                content = raw_content.decode('utf-8', errors='replace')
+
+            title = self._get_title_from_html(content, file)
+        except Exception as e:
+            print(f"读取文件标题时出错: {rel_path} - {str(e)}")
+            title = os.path.splitext(file)[0].replace('-', ' ').replace('_', ' ').title()
+
+        return self._make_index_entry(rel_path, title)
+
     def _create_index_html(self):
         """创建索引HTML页面"""
         try:
             # 准备存储文件信息
             file_info = []
-            categories = {}
 
-            # 首先扫描源目录中的文件
-            print(f"扫描源目录查找文章: {self.download_dir}")
-            for root, _, files in os.walk(self.download_dir):
-                for file in files:
-                    if file.endswith(('.html', '.htm')) and file != 'index.html':
-                        file_path = os.path.join(root, file)
-                        rel_path = os.path.relpath(file_path, self.download_dir)
+            for file_path, rel_path, entry in self._index_candidates():
+                # 中断的运行只收录已完成的文件；近似重复的变体页面不单独收录
+                if (self.stop_requested or self.deadline_reached) and rel_path not in self.journal.completed:
+                    continue
+                if rel_path in self.duplicates:
+                    continue
+
+                # 优先使用处理时记录的标题，其次读取缓存条目，最后才读取文件
+                title = self.journal.metadata.get(rel_path, {}).get('title')
+                if title is not None:
+                    info = self._make_index_entry(rel_path, title)
+                elif entry is not None and entry.in_cache:
+                    info = self._read_index_entry(file_path, rel_path, self.cache_reader.read(entry), entry.charset)
+                else:
+                    info = self._read_index_entry(file_path, rel_path)
+                self.index_entries[rel_path] = info
+                file_info.append(info)
+                print(f"找到文章: {rel_path} -> {info['title']} [分类: {info['category']}]")
 
-                        # 计算目标位置
-                        output_path = os.path.join(self.output_dir, self.domain, rel_path)
+            return self._write_index_pages(file_info)
 
-                        # 分析目录结构获取分类
-                        parts = rel_path.split(os.sep)
-                        if len(parts) > 1:
-                            category = parts[0] if len(parts) > 1 else "其他"
-                        else:
-                            category = "其他"
+        except Exception as e:
+            print(f"创建索引页面时出错: {str(e)}")
+            return False
 
-                        # 读取文件获取标题
-                        try:
-                            content = None
-                            # 尝试多种编码读取文件
-                            for encoding in ['utf-8', 'gbk', 'gb2312', 'iso-8859-1']:
-                                try:
-                                    with open(file_path, 'r', encoding=encoding) as f:
-                                        content = f.read()
-                                    break
-                                except UnicodeDecodeError:
-                                    continue
-
-                            # 如果所有编码都失败，使用替换错误的方式
-                            if content is None:
-                                with open(file_path, 'r', encoding='utf-8', errors='replace') as f:
-                                    content = f.read()
-
-                            title_match = re.search(r'<title>(.*?)</title>', content)
-                            if title_match:
-                                title = title_match.group(1)
-                            else:
-                                h1_match = re.search(r'<h1[^>]*>(.*?)</h1>', content)
-                                if h1_match:
-                                    title = h1_match.group(1)
-                                else:
-                                    title = os.path.splitext(file)[0].replace('-', ' ').replace('_', ' ').title()
-                        except Exception as e:
-                            print(f"读取文件标题时出错: {rel_path} - {str(e)}")
-                            title = os.path.splitext(file)[0].replace('-', ' ').replace('_', ' ').title()
-
-                        # 构建网站内的相对路径
-                        web_path = '/' + self.domain + '/' + rel_path
-
-                        # 记录文件信息
-                        info = {
-                            'path': web_path,
-                            'title': title,
-                            'category': category
-                        }
-                        file_info.append(info)
-                        print(f"找到文章: {rel_path} -> {title} [分类: {category}]")
-
-                        # 按分类组织
-                        if category not in categories:
-                            categories[category] = []
-                        categories[category].append(info)
+        finally:
+            if self.cache_reader is not None:
+                self.cache_reader.close()
+                self.cache_reader = None
+
+    def _index_candidates(self):
+        """列出要收录进索引的页面 (文件路径, 相对路径, 缓存条目)：从httrack缓存读取时使用缓存条目，否则扫描源目录"""
+        if self.cache_reader is not None:
+            print(f"从httrack缓存条目查找文章: {len(self.cache_pages)} 个页面")
+            return self.cache_pages
+
+        from website_converter.htscache import CACHE_DIR_NAME
+
+        print(f"扫描源目录查找文章: {self.download_dir}")
+        candidates = []
+        for root, dirs, files in os.walk(self.download_dir):
+            if CACHE_DIR_NAME in dirs:
+                dirs.remove(CACHE_DIR_NAME)
+            for file in files:
+                if self._is_index_page(file):
+                    file_path = os.path.join(root, file)
+                    candidates.append((file_path, os.path.relpath(file_path, self.download_dir), None))
+        return candidates
+
+    def _write_index_pages(self, file_info):
+        """根据索引条目生成域名索引页和根目录跳转页"""
+        try:
+            # 按分类组织
+            categories = {}
+            for info in file_info:
+                categories.setdefault(info['category'], []).append(info)
 
             # 如果没有文件，添加测试文章
             if not file_info:
@@ -759,7 +1435,7 @@ a:hover {
     <meta charset="UTF-8">
     <meta name="viewport" content="width=device-width, initial-scale=1.0">
     <title>{self.args.title}</title>
-    <link rel="stylesheet" href="/{self.domain}/static/index.css">
+    <link rel="stylesheet" href="{self._asset_url('static/index.css')}">
 </head>
 <body>
     <header>
@@ -805,8 +1481,7 @@ a:hover {
 
             # 写入文件
             index_path = os.path.join(self.output_dir, self.domain, 'index.html')
-            with open(index_path, 'w', encoding='utf-8') as f:
-                f.write(html_content)
+            self.writer.write(index_path, html_content)
 
             # 创建根目录索引，自动跳转到域名目录
             root_index_path = os.path.join(self.output_dir, 'index.html')
@@ -822,8 +1497,7 @@ a:hover {
 </body>
 </html>
 """
-            with open(root_index_path, 'w', encoding='utf-8') as f:
-                f.write(root_index_content)
+            self.writer.write(root_index_path, root_index_content)
 
             return True
 
@@ -831,8 +1505,131 @@ a:hover {
             print(f"创建索引页面时出错: {str(e)}")
             return False
 
+    def _write_shard_fragment(self):
+        """输出本分片的元数据片段（标题、分类、链接），供合并步骤使用"""
+        try:
+            index, total = self.shard
+            pages = []
+            for rel_path, meta in sorted(self.journal.metadata.items()):
+                # 近似重复的变体页面没有标题，不收录
+                if os.path.basename(rel_path) == 'index.html' or 'title' not in meta:
+                    continue
+                pages.append({
+                    'rel_path': rel_path.replace(os.sep, '/'),
+                    'title': meta['title'],
+                    'links': meta.get('links', []),
+                })
+            fragment = {
+                'shard': index,
+                'shards': total,
+                'domain': self.domain,
+                'title': self.args.title,
+                'complete': not (self.stop_requested or self.deadline_reached),
+                'files': self.total_count,
+                'completed_files': len(self.journal.completed),
+                'pages': pages,
+            }
+            from website_converter import shard
+            path = shard.write_fragment(self.output_dir, index, total, fragment)
+            print(f"分片元数据已写入: {path} ({len(pages)} 个页面)")
+            return True
+        except Exception as e:
+            print(f"写入分片元数据时出错: {str(e)}")
+            return False
+
+    def _merge_shards(self):
+        """合并各分片的元数据片段，生成最终的索引页面，不重新读取任何页面"""
+        from website_converter import shard
+
+        print(f"合并分片元数据: {self.output_dir}")
+        try:
+            fragments, total, missing = shard.load_fragments(self.output_dir)
+        except Exception as e:
+            print(f"读取分片元数据时出错: {str(e)}")
+            return False
+
+        if not fragments:
+            print("错误: 没有找到分片元数据，请先使用 --shard i/N 运行各分片")
+            return False
+        if missing:
+            print(f"{'警告' if self.args.allow_partial else '错误'}: 缺少分片 {missing} (共 {total} 个)")
+            if not self.args.allow_partial:
+                return False
+        incomplete = [f['shard'] for f in fragments if not f.get('complete')]
+        if incomplete:
+            print(f"警告: 分片 {incomplete} 未完整运行，索引中只包含其已完成的页面")
+
+        # 域名和网站标题以分片记录为准
+        domains = {f['domain'] for f in fragments}
+        if len(domains) > 1:
+            print(f"错误: 分片的域名不一致: {sorted(domains)}")
+            return False
+        self.domain = domains.pop()
+        self.args.title = fragments[0].get('title', self.args.title)
+
+        file_info = []
+        for fragment in fragments:
+            for page in fragment['pages']:
+                file_info.append(self._make_index_entry(page['rel_path'], page['title']))
+
+        self._safe_mkdir(os.path.join(self.output_dir, self.domain, 'static'))
+        ok = self._create_default_css() and self._write_index_pages(file_info)
+        self._write_asset_manifest()
+        if not self.writer.close():
+            ok = False
+        if not ok:
+            print("合并失败")
+            return False
+
+        print(f"合并完成: {len(fragments)}/{total} 个分片，{len(file_info)} 个页面")
+        if self.args.server:
+            self.phase = 'serve'
+            self._start_http_server()
+        return True
+
+    def _serve_on_demand(self):
+        """按需转换模式：页面在第一次被请求时转换并缓存，源文件修改后自动重新转换"""
+        if not os.path.isdir(self.download_dir):
+            print(f"错误: 下载目录不存在: {self.download_dir}")
+            return False
+        if self.shard:
+            print("按需转换模式不支持分片")
+            return False
+
+        self._safe_mkdir(os.path.join(self.output_dir, self.domain, 'static'))
+        if not self._create_default_css():
+            return False
+        self._write_asset_manifest()
+        self.writer.flush()
+
+        print("按需转换模式: 页面在第一次被请求时转换，结果缓存在输出目录和内存中")
+        self.phase = 'serve'
+        ok = self._start_http_server(on_demand=True)
+
+        if self.httpd is not None:
+            self.httpd.server_close()
+            stats = self.httpd.site.stats
+            print(f"按需转换统计: 转换 {stats['conversions']} 次，内存缓存命中 {stats['memory_hits']} 次，"
+                  f"磁盘缓存命中 {stats['disk_hits']} 次，合并并发请求 {stats['coalesced']} 次，转换失败 {stats['failures']} 次")
+        if not self.writer.close():
+            print("警告: 部分文件写入失败")
+        return ok
+
+    def _write_asset_manifest(self):
+        """写出资源清单（站点内路径 -> 带内容哈希的路径）"""
+        if self.fingerprints is None:
+            return
+        from website_converter.fingerprint import MANIFEST_NAME
+
+        manifest_path = os.path.join(self.output_dir, self.domain, MANIFEST_NAME)
+        self.writer.write(manifest_path, self.fingerprints.to_json())
+        if self.args.verbose:
+            print(f"资源指纹: {len(self.fingerprints.assets)} 个文件，清单: {manifest_path}")
+
     def _is_port_available(self, port):
         """检查端口是否可用"""
+        import socket
+
         try:
             with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
                 s.bind(('', port))
@@ -840,8 +1637,13 @@ a:hover {
         except:
             return False
 
-    def _start_http_server(self):
-        """启动HTTP服务器"""
+    def _start_http_server(self, background=False, on_demand=False):
+        """启动HTTP服务器，background为True时在后台线程中运行并立即返回，
+        on_demand为True时以下载目录为数据源按需转换页面"""
+        import threading
+        import webbrowser
+        from website_converter.server import MirrorHTTPServer, serve_in_background
+
         port = self.args.port
 
         # 检查端口是否可用
@@ -856,14 +1658,18 @@ a:hover {
                 return False
 
         try:
-            # 创建HTTP服务器处理器
-            handler = http.server.SimpleHTTPRequestHandler
-
-            # 切换到输出目录
+            # 切换到输出目录（先把目录转为绝对路径，服务器启动后仍可继续处理文件）
+            self.download_dir = os.path.abspath(self.download_dir)
+            self.output_dir = os.path.abspath(self.output_dir)
             os.chdir(self.output_dir)
 
             # 创建服务器
-            httpd = socketserver.TCPServer(("", port), handler)
+            if on_demand:
+                from website_converter.ondemand import OnDemandSite, OnDemandHTTPServer
+                httpd = OnDemandHTTPServer(("", port), OnDemandSite(self))
+            else:
+                httpd = MirrorHTTPServer(("", port))
+            self.httpd = httpd
 
             # 打印服务器信息
             url = f"http://localhost:{port}"
@@ -875,6 +1681,10 @@ a:hover {
             # 打开浏览器
             threading.Timer(1, lambda: webbrowser.open(index_url)).start()
 
+            if background:
+                serve_in_background(httpd)
+                return True
+
             # 运行服务器
             print("按 Ctrl+C 停止服务器...\n")
             httpd.serve_forever()
@@ -885,3 +1695,134 @@ a:hover {
         except Exception as e:
             print(f"启动HTTP服务器时出错: {str(e)}")
             return False
+
+    def _url_path(self, output_path):
+        """输出文件对应的服务器URL路径"""
+        rel_path = os.path.relpath(output_path, self.output_dir)
+        return '/' + rel_path.replace(os.sep, '/')
+
+    def _watch_sources(self):
+        """监视下载目录，只重新转换变化的文件，并增量更新索引和服务器缓存"""
+        interval = self.args.watch_interval
+        print(f"\n监视模式: 每 {interval} 秒检查一次 {self.download_dir} 的变化，按 Ctrl+C 退出")
+
+        from website_converter.watch import DELETED
+
+        dispatch, default_processor = build_dispatch_table(self.args.file_types)
+        domain_dir = os.path.join(self.output_dir, self.domain)
+        self.phase = 'watch'
+        try:
+            while not self.stop_requested:
+                changes = self.watcher.wait_for_changes(interval, self.args.watch_debounce,
+                                                        should_stop=lambda: self.stop_requested)
+                if not changes:
+                    continue
+
+                start = time.time()
+                touched = []
+                index_changed = False
+                ordered = sorted(changes.items())
+                if self.fingerprints is not None:
+                    # 先处理资源，同一批变化中的页面直接引用新的指纹；记下资源原来的指纹
+                    ordered.sort(key=lambda item: not self.fingerprints.is_asset(item[0]))
+                    previous = {rel_path.replace(os.sep, '/'): None for rel_path, kind in ordered
+                                if kind != DELETED and self.fingerprints.is_asset(rel_path)}
+                    for rel_url in previous:
+                        previous[rel_url] = self.fingerprints.assets.get(rel_url)
+                for rel_path, kind in ordered:
+                    ext = os.path.splitext(rel_path)[1].lower()
+                    processor = dispatch.get(ext, default_processor)
+                    if processor is None:
+                        continue
+                    file_path = os.path.join(self.download_dir, rel_path)
+                    output_path = processor.output_path(os.path.join(domain_dir, rel_path))
+
+                    if kind == DELETED:
+                        if os.path.exists(output_path):
+                            os.remove(output_path)
+                        print(f"删除: {rel_path}")
+                    else:
+                        self.duplicates.pop(rel_path, None)
+                        processor.process(self, file_path, output_path)
+                        self.page_meta.pop(file_path, None)
+                        print(f"{processor.label}: {rel_path}")
+                    touched.append(output_path)
+
+                    # 只修补受影响的索引条目
+                    if ext in ('.html', '.htm') and os.path.basename(rel_path) != 'index.html':
+                        index_changed = True
+                        if kind == DELETED or rel_path in self.duplicates:
+                            self.index_entries.pop(rel_path, None)
+                        else:
+                            self.index_entries[rel_path] = self._read_index_entry(file_path, rel_path)
+
+                # 资源内容变化后指纹随之变化：带哈希的URL会被浏览器长期缓存，
+                # 引用旧指纹的已生成页面需要重新转换才能看到新内容（旧的带哈希文件保留）
+                if self.fingerprints is not None:
+                    stale = [old for rel_url, old in previous.items()
+                             if old is not None and self.fingerprints.assets.get(rel_url) != old]
+                    if stale:
+                        touched.extend(self._refresh_asset_references(stale, set(touched), dispatch, default_processor))
+                    if any(self.fingerprints.is_asset(path) for path in touched):
+                        self._write_asset_manifest()
+
+                if index_changed:
+                    self._write_index_pages(list(self.index_entries.values()))
+                    touched.append(os.path.join(domain_dir, 'index.html'))
+                self.writer.flush()
+
+                # 刷新服务器缓存中对应的页面
+                if self.httpd is not None:
+                    self.httpd.invalidate(self._url_path(path) for path in touched)
+                print(f"已更新 {len(touched)} 个文件，用时 {time.time() - start:.2f} 秒")
+        except KeyboardInterrupt:
+            pass
+        finally:
+            self.writer.close()
+            if self.httpd is not None:
+                self.httpd.shutdown()
+                self.httpd.server_close()
+        # 监视模式只能通过Ctrl+C或超时结束，属于正常退出
+        self.stop_requested = None
+        print("\n监视已停止")
+        return True
+
+    def _refresh_asset_references(self, stale, skip, dispatch, default_processor):
+        """重新转换引用了旧指纹（带哈希的相对路径）的已生成页面，返回重新生成的输出文件列表
+
+        带哈希的文件名只会出现在引用它的页面中，逐个检查输出目录中的页面即可找到，
+        包括之前运行生成、本次没有转换过的页面；skip中的页面刚刚转换过，不再检查。
+        """
+        domain_dir = os.path.join(self.output_dir, self.domain)
+        prefix = f'/{self.domain}/'.encode('utf-8')
+        needles = [prefix + name.encode('utf-8') for name in stale]
+        refreshed = []
+        for root, dirs, files in os.walk(domain_dir):
+            for file in files:
+                output_path = os.path.join(root, file)
+                if not file.endswith(('.html', '.htm')) or output_path in skip:
+                    continue
+                try:
+                    with open(output_path, 'rb') as f:
+                        content = f.read()
+                except OSError:
+                    continue
+                if not any(needle in content for needle in needles):
+                    continue
+
+                # 输出页面可能由同名的 .html、.htm 或 .md 源文件生成
+                rel_path = os.path.relpath(output_path, domain_dir)
+                base = os.path.splitext(rel_path)[0]
+                for candidate in (rel_path, base + '.html', base + '.htm', base + '.md'):
+                    processor = dispatch.get(os.path.splitext(candidate)[1].lower(), default_processor)
+                    file_path = os.path.join(self.download_dir, candidate)
+                    if processor is None or not os.path.isfile(file_path) or \
+                            processor.output_path(os.path.join(domain_dir, candidate)) != output_path:
+                        continue
+                    self.duplicates.pop(candidate, None)
+                    processor.process(self, file_path, output_path)
+                    self.page_meta.pop(file_path, None)
+                    print(f"{processor.label}（引用的资源已更新）: {candidate}")
+                    refreshed.append(output_path)
+                    break
+        return refreshed
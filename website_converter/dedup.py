@@ -0,0 +1,139 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+近似重复页面检测模块
+
+对页面可见文本计算64位SimHash指纹，用分段LSH索引查找汉明距离在阈值内的
+已知页面。论坛、CMS站点中大量的分页、排序、打印视图和会话ID变体页面
+只需转换一个代表页面，其余变体指向它即可。
+"""
+
+import hashlib
+import re
+
+_SCRIPT_STYLE_RE = re.compile(r'<(script|style|noscript)\b.*?</\1\s*>', re.IGNORECASE | re.DOTALL)
+_COMMENT_RE = re.compile(r'<!--.*?-->', re.DOTALL)
+_TAG_RE = re.compile(r'<[^>]+>')
+# 英文和数字按单词切分，中日韩文字按单字切分
+_TOKEN_RE = re.compile(r'[a-z0-9]+|[\u3040-\u30ff\u3400-\u4dbf\u4e00-\u9fff\uac00-\ud7af]')
+
+HASH_BITS = 64
+
+# 按位计数时每一位占用的计数槽宽度；把一个字节的8位展开到8个计数槽的查找表，
+# 这样每个特征只需8次查表和一次大整数加法，而不是逐位循环64次
+_LANE = 24
+_LANE_MASK = (1 << _LANE) - 1
+_SPREAD = [sum(((b >> i) & 1) << (i * _LANE) for i in range(8)) for b in range(256)]
+
+
+def visible_text(html):
+    """提取HTML中的可见文本（去掉脚本、样式、注释和标签）"""
+    html = _SCRIPT_STYLE_RE.sub(' ', html)
+    html = _COMMENT_RE.sub(' ', html)
+    return _TAG_RE.sub(' ', html)
+
+
+def tokenize(text):
+    """把文本切分为小写的词元"""
+    return _TOKEN_RE.findall(text.lower())
+
+
+def simhash(tokens, shingle=3):
+    """计算词元序列的64位SimHash，特征为连续shingle个词元"""
+    if len(tokens) < shingle:
+        features = [' '.join(tokens)] if tokens else []
+    else:
+        features = [' '.join(tokens[i:i + shingle]) for i in range(len(tokens) - shingle + 1)]
+
+    weights = {}
+    for feature in features:
+        weights[feature] = weights.get(feature, 0) + 1
+
+    # 统计每一位上置1的特征权重之和，超过总权重一半的位取1
+    counts = 0
+    total = 0
+    for feature, weight in weights.items():
+        digest = hashlib.blake2b(feature.encode('utf-8'), digest_size=8).digest()
+        spread = 0
+        for i, byte in enumerate(digest):
+            spread |= _SPREAD[byte] << (i * 8 * _LANE)
+        counts += weight * spread
+        total += weight
+        if total >= _LANE_MASK:
+            break
+
+    value = 0
+    for bit in range(HASH_BITS):
+        if (counts >> (bit * _LANE) & _LANE_MASK) * 2 > total:
+            value |= 1 << bit
+    return value
+
+
+def hamming(a, b):
+    """两个指纹之间的汉明距离"""
+    return bin(a ^ b).count('1')
+
+
+class SimHashIndex:
+    """SimHash的LSH索引
+
+    把64位指纹切成 distance+1 段，根据抽屉原理，汉明距离不超过distance的两个指纹
+    至少有一段完全相同，因此只需比较至少一段相同的候选指纹。
+    """
+
+    def __init__(self, distance=3):
+        self.distance = distance
+        bands = distance + 1
+        width = HASH_BITS // bands
+        self._bands = []
+        start = 0
+        for i in range(bands):
+            end = HASH_BITS if i == bands - 1 else start + width
+            self._bands.append((start, (1 << (end - start)) - 1))
+            start = end
+        self._buckets = {}
+        self.clusters = {}   # 代表页面 -> {'hash': 指纹, 'members': [变体页面...]}
+        self.comparisons = 0
+
+    def _keys(self, value):
+        return [(i, value >> start & mask) for i, (start, mask) in enumerate(self._bands)]
+
+    def find(self, value):
+        """查找与指纹足够接近的代表页面，没有则返回None"""
+        best = None
+        best_distance = self.distance + 1
+        seen = set()
+        for key in self._keys(value):
+            for canonical in self._buckets.get(key, ()):
+                if canonical in seen:
+                    continue
+                seen.add(canonical)
+                self.comparisons += 1
+                d = hamming(value, self.clusters[canonical]['hash'])
+                if d < best_distance:
+                    best, best_distance = canonical, d
+        return best
+
+    def add(self, key, value):
+        """登记页面，返回其代表页面（新簇时返回key本身）"""
+        canonical = self.find(value)
+        if canonical is not None:
+            self.clusters[canonical]['members'].append(key)
+            return canonical
+        self.clusters[key] = {'hash': value, 'members': []}
+        for band_key in self._keys(value):
+            self._buckets.setdefault(band_key, []).append(key)
+        return key
+
+    def stats(self, top=5):
+        """返回聚类统计信息"""
+        groups = [(canonical, len(c['members'])) for canonical, c in self.clusters.items() if c['members']]
+        groups.sort(key=lambda item: -item[1])
+        return {
+            'pages': sum(1 + len(c['members']) for c in self.clusters.values()),
+            'clusters': len(self.clusters),
+            'duplicate_clusters': len(groups),
+            'duplicates': sum(n for _, n in groups),
+            'comparisons': self.comparisons,
+            'largest': groups[:top],
+        }
@@ -0,0 +1,80 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+静态资源指纹模块
+
+把CSS、脚本、图片、字体等静态资源另存为带内容哈希的文件名（如 index.3f2a9c01bd.css），
+页面中的引用改写为该文件名。内容变化时文件名随之变化，服务器因此可以让浏览器
+永久缓存这些文件，重复浏览页面时不再对资源发出任何请求。
+"""
+
+import hashlib
+import json
+import posixpath
+import re
+
+MANIFEST_NAME = 'asset-manifest.json'
+
+# 参与指纹处理的静态资源扩展名（HTML页面本身需要每次重新验证，不在其中）
+ASSET_EXTENSIONS = ('.css', '.js', '.mjs', '.png', '.jpg', '.jpeg', '.gif', '.svg', '.webp', '.avif', '.ico',
+                    '.bmp', '.woff', '.woff2', '.ttf', '.otf', '.eot')
+
+HASH_LENGTH = 10
+
+_FINGERPRINTED_RE = re.compile(r'\.[0-9a-f]{%d}\.[A-Za-z0-9]+$' % HASH_LENGTH)
+
+
+def is_asset(path):
+    """是否为参与指纹处理的静态资源"""
+    return posixpath.splitext(path)[1].lower() in ASSET_EXTENSIONS
+
+
+def is_fingerprinted(path):
+    """路径的文件名是否带有内容哈希"""
+    return bool(_FINGERPRINTED_RE.search(path))
+
+
+def fingerprinted_name(rel_path, content):
+    """根据内容计算带哈希的文件名：dir/name.ext -> dir/name.<哈希>.ext"""
+    digest = hashlib.md5(content).hexdigest()[:HASH_LENGTH]
+    base, ext = posixpath.splitext(rel_path)
+    return f'{base}.{digest}{ext}'
+
+
+class AssetManifest:
+    """资源清单：站点内相对路径（/ 分隔）-> 带哈希的相对路径"""
+
+    def __init__(self):
+        self.assets = {}
+
+    def is_asset(self, path):
+        """是否为参与指纹处理的静态资源"""
+        return is_asset(path)
+
+    def add(self, rel_path, content):
+        """登记资源内容，返回带哈希的相对路径"""
+        rel_path = rel_path.replace('\\', '/')
+        fingerprinted = fingerprinted_name(rel_path, content)
+        self.assets[rel_path] = fingerprinted
+        return fingerprinted
+
+    def restore(self, rel_path, fingerprinted):
+        """恢复上次运行登记的资源（--resume）"""
+        self.assets[rel_path.replace('\\', '/')] = fingerprinted
+
+    def lookup(self, rel_url):
+        """查找站点内相对URL对应的带哈希URL（保留查询参数和锚点），未登记时返回None"""
+        if not self.assets:
+            return None
+        cut = len(rel_url)
+        for sep in '?#':
+            pos = rel_url.find(sep)
+            if pos != -1:
+                cut = min(cut, pos)
+        fingerprinted = self.assets.get(posixpath.normpath(rel_url[:cut]))
+        if fingerprinted is None:
+            return None
+        return fingerprinted + rel_url[cut:]
+
+    def to_json(self):
+        return json.dumps(self.assets, ensure_ascii=False, indent=2, sort_keys=True)
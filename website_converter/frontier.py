@@ -0,0 +1,354 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+抓取队列（frontier）模块
+
+为下载流程提供URL调度：
+- URL规范化（大小写、默认端口、片段、查询参数排序与忽略列表）
+- 内存紧凑的已见集合（布隆过滤器 + 64位指纹精确回退）
+- 按深度和主机优先的调度队列，每个主机使用令牌桶控制访问频率
+"""
+
+import hashlib
+import heapq
+import re
+import time
+from array import array
+from bisect import bisect_left
+from fnmatch import translate
+from functools import lru_cache
+from itertools import count
+from math import ceil, log
+from urllib.parse import urlsplit, urlunsplit, unquote_plus
+
+DEFAULT_PORTS = {'http': 80, 'https': 443, 'ftp': 21}
+
+# 默认忽略的跟踪/会话类查询参数
+DEFAULT_IGNORED_PARAMS = ('utm_*', 'fbclid', 'gclid', 'sessionid', 'phpsessid', 'jsessionid', 'sid')
+
+
+@lru_cache(maxsize=32)
+def _ignored_params_regex(ignored_params):
+    """把忽略参数的通配符列表编译为一个正则"""
+    if not ignored_params:
+        return None
+    return re.compile('|'.join(translate(p.lower()) for p in ignored_params))
+
+
+def remove_dot_segments(path):
+    """按 RFC 3986 5.2.4 移除绝对路径中的 . 和 .. 段，空段和末尾斜杠保持不变"""
+    segments = path.split('/')
+    output = []
+    for segment in segments:
+        if segment == '.':
+            continue
+        if segment == '..':
+            if len(output) > 1:
+                output.pop()
+            continue
+        output.append(segment)
+    # 以 . 或 .. 结尾的路径指向目录，保留末尾斜杠（/a/b/.. -> /a/）
+    if segments[-1] in ('.', '..'):
+        output.append('')
+    return '/'.join(output)
+
+
+def normalize_url(url, ignored_params=DEFAULT_IGNORED_PARAMS):
+    """规范化URL，使等价的URL得到相同的字符串
+
+    - scheme和主机名转为小写，去掉默认端口
+    - 去掉片段(#...)
+    - 按 RFC 3986 移除路径中的 . 和 .. 段，空路径补为 /
+    - 查询参数按名称排序，去掉忽略列表中的参数（支持通配符，大小写不敏感）；
+      参数保持原样，不解码也不重新编码
+    """
+    parts = urlsplit(url.strip())
+    scheme = parts.scheme.lower()
+
+    host = (parts.hostname or '').rstrip('.')
+    if ':' in host:
+        host = '[' + host + ']'  # IPv6地址需要保留方括号
+    try:
+        port = parts.port
+    except ValueError:
+        port = None
+    netloc = host
+    if parts.username:
+        userinfo = parts.username
+        if parts.password:
+            userinfo += ':' + parts.password
+        netloc = userinfo + '@' + netloc
+    if port is not None and DEFAULT_PORTS.get(scheme) != port:
+        netloc += ':' + str(port)
+
+    path = parts.path or '/'
+    if '/.' in path and path.startswith('/'):
+        path = remove_dot_segments(path)
+
+    query = ''
+    if parts.query:
+        # 按原始的 名称=值 片段处理：解码再编码会改变请求（a%20b -> a+b，flag -> flag=）
+        ignored = _ignored_params_regex(tuple(ignored_params))
+        params = [param for param in parts.query.split('&')
+                  if param and (ignored is None or not ignored.match(unquote_plus(param.partition('=')[0]).lower()))]
+        params.sort(key=lambda param: param.partition('=')[0])
+        query = '&'.join(params)
+
+    return urlunsplit((scheme, netloc, path, query, ''))
+
+
+def url_host(url):
+    """返回规范化URL中的主机部分（含非默认端口）"""
+    return urlsplit(url).netloc.rpartition('@')[2]
+
+
+class BloomFilter:
+    """简单的布隆过滤器，使用双重哈希生成k个位置"""
+
+    def __init__(self, capacity, error_rate=0.01):
+        capacity = max(1, capacity)
+        self.size = max(8, int(ceil(-capacity * log(error_rate) / (log(2) ** 2))))
+        self.hashes = max(1, int(round(self.size / capacity * log(2))))
+        self.bits = bytearray((self.size + 7) // 8)
+
+    def _positions(self, h1, h2):
+        size = self.size
+        for i in range(self.hashes):
+            yield (h1 + i * h2) % size
+
+    def add_hashes(self, h1, h2):
+        """按两个哈希值置位，返回置位前是否可能已存在"""
+        bits = self.bits
+        present = True
+        for pos in self._positions(h1, h2):
+            byte, mask = pos >> 3, 1 << (pos & 7)
+            if not bits[byte] & mask:
+                present = False
+                bits[byte] |= mask
+        return present
+
+    def memory_bytes(self):
+        """位数组占用的字节数"""
+        return len(self.bits)
+
+
+class SeenSet:
+    """已见URL集合
+
+    先查布隆过滤器：判定为新URL时无需查精确集合；判定为“可能已存在”时，
+    再到64位指纹的精确集合中确认，布隆过滤器的误判不会导致漏抓。
+    精确集合保存的是64位指纹，两个不同URL的指纹相同时后者会被当作已见（百万级URL时概率约为 n²/2⁶⁵，可忽略）。
+    精确集合由有序 array('Q') 加小缓冲区组成，每个URL约占8字节；缓冲区原地归并进数组，
+    归并时不复制整个数组，也不创建装箱整数的列表，内存峰值只比稳定占用多出一个缓冲区。
+    """
+
+    def __init__(self, expected=1000000, error_rate=0.01, buffer_size=65536):
+        self.bloom = BloomFilter(expected, error_rate)
+        self.buffer_size = buffer_size
+        self._sorted = array('Q')
+        self._buffer = set()
+        self._count = 0
+        self.bloom_negatives = 0
+        self.exact_checks = 0
+        self.false_positives = 0
+
+    @staticmethod
+    def _digest(url):
+        digest = hashlib.blake2b(url.encode('utf-8'), digest_size=16).digest()
+        fingerprint = int.from_bytes(digest[:8], 'little')
+        h2 = int.from_bytes(digest[8:], 'little') | 1
+        return fingerprint, h2
+
+    def _contains_fingerprint(self, fingerprint):
+        if fingerprint in self._buffer:
+            return True
+        index = bisect_left(self._sorted, fingerprint)
+        return index < len(self._sorted) and self._sorted[index] == fingerprint
+
+    def _store(self, fingerprint):
+        self._buffer.add(fingerprint)
+        if len(self._buffer) >= self.buffer_size:
+            self._merge_buffer()
+
+    def _merge_buffer(self):
+        """把缓冲区归并进有序数组：数组原地扩展后从尾部向前归并，
+        每个缓冲值用二分查找定位，其间的整段旧数据用 memoryview 一次移动"""
+        values = sorted(self._buffer)
+        self._buffer = set()
+        data = self._sorted
+        end = len(data)
+        data.frombytes(bytes(data.itemsize * len(values)))
+        write = len(data)
+        view = memoryview(data)
+        try:
+            for value in reversed(values):
+                start = bisect_left(data, value, 0, end)
+                if start < end:
+                    view[write - (end - start):write] = view[start:end]
+                    write -= end - start
+                write -= 1
+                data[write] = value
+                end = start
+        finally:
+            view.release()
+
+    def add(self, url):
+        """加入URL，返回True表示此前未见过"""
+        fingerprint, h2 = self._digest(url)
+        if self.bloom.add_hashes(fingerprint, h2):
+            self.exact_checks += 1
+            if self._contains_fingerprint(fingerprint):
+                return False
+            self.false_positives += 1
+        else:
+            self.bloom_negatives += 1
+        self._store(fingerprint)
+        self._count += 1
+        return True
+
+    def __contains__(self, url):
+        fingerprint, _ = self._digest(url)
+        return self._contains_fingerprint(fingerprint)
+
+    def __len__(self):
+        return self._count
+
+    def memory_bytes(self):
+        """估算占用的内存字节数"""
+        return (self.bloom.memory_bytes() + self._sorted.itemsize * len(self._sorted)
+                + len(self._buffer) * 40)
+
+
+class _HostQueue:
+    """单个主机的待抓队列与令牌桶"""
+
+    __slots__ = ('host', 'heap', 'tokens', 'updated', 'entry', 'entry_depth', 'waiting')
+
+    def __init__(self, host, tokens, now):
+        self.host = host
+        self.heap = []
+        self.tokens = tokens
+        self.updated = now
+        self.entry = None        # 当前有效的调度条目序号，None表示未排队
+        self.entry_depth = None
+        self.waiting = False
+
+
+class Frontier:
+    """抓取调度队列
+
+    每个主机维护自己的按深度排序的队列；主机之间按队首深度排序，
+    取出URL需要消耗该主机令牌桶中的一个令牌，令牌不足的主机进入等待堆。
+
+    rate: 每个主机每秒补充的令牌数（即稳定状态下的请求速率）
+    burst: 令牌桶容量（允许的突发请求数）
+    max_depth: 超过该深度的URL不入队，None表示不限制
+    """
+
+    def __init__(self, rate=1.0, burst=1, max_depth=None, ignored_params=DEFAULT_IGNORED_PARAMS,
+                 expected_urls=1000000, clock=time.monotonic):
+        self.rate = rate
+        self.burst = max(1, burst)
+        self.max_depth = max_depth
+        self.ignored_params = tuple(ignored_params)
+        self.seen = SeenSet(expected_urls)
+        self.clock = clock
+
+        self._hosts = {}
+        self._ready = []     # (深度, 序号, 主机)：有令牌、可立即抓取的主机
+        self._waiting = []   # (可用时间, 序号, 主机)：等待令牌的主机
+        self._seq = count()
+        self._pending = 0
+
+    def __len__(self):
+        return self._pending
+
+    def push(self, url, depth=0):
+        """URL入队，返回规范化后的URL；重复或超出深度时返回None"""
+        if self.max_depth is not None and depth > self.max_depth:
+            return None
+        url = normalize_url(url, self.ignored_params)
+        if not self.seen.add(url):
+            return None
+
+        host = url_host(url)
+        queue = self._hosts.get(host)
+        if queue is None:
+            queue = self._hosts[host] = _HostQueue(host, float(self.burst), self.clock())
+        heapq.heappush(queue.heap, (depth, next(self._seq), url))
+        self._pending += 1
+
+        # 未排队的主机需要排队；已就绪的主机来了更浅的URL时重新排队（旧条目作废）
+        if queue.entry is None or (not queue.waiting and depth < queue.entry_depth):
+            self._schedule(queue, self.clock())
+        return url
+
+    def pop(self):
+        """取出下一个可抓取的 (url, depth)，所有主机都在等待令牌或队列为空时返回None"""
+        now = self.clock()
+        self._release_waiting(now)
+
+        while self._ready:
+            _, seq, host = heapq.heappop(self._ready)
+            queue = self._hosts[host]
+            if seq != queue.entry:
+                continue  # 过期条目
+
+            self._refill(queue, now)
+            if queue.tokens < 1:
+                self._schedule(queue, now)
+                continue
+
+            queue.tokens -= 1
+            queue.entry = None
+            depth, _, url = heapq.heappop(queue.heap)
+            self._pending -= 1
+            if queue.heap:
+                self._schedule(queue, now)
+            return url, depth
+        return None
+
+    def next_ready_in(self):
+        """距离下一个URL可取出的秒数；已有可取出的URL时返回0，队列为空时返回None"""
+        now = self.clock()
+        self._release_waiting(now)
+        if self._ready:
+            return 0.0
+        if self._waiting:
+            return max(0.0, self._waiting[0][0] - now)
+        return None
+
+    def host_count(self):
+        """已知主机数"""
+        return len(self._hosts)
+
+    def _refill(self, queue, now):
+        """按经过时间补充令牌"""
+        if queue.tokens < self.burst:
+            queue.tokens = min(float(self.burst), queue.tokens + (now - queue.updated) * self.rate)
+        queue.updated = now
+
+    def _schedule(self, queue, now):
+        """为主机登记新的调度条目，放入就绪堆或等待堆"""
+        seq = next(self._seq)
+        queue.entry = seq
+        queue.entry_depth = queue.heap[0][0]
+        self._refill(queue, now)
+        if queue.tokens >= 1:
+            queue.waiting = False
+            heapq.heappush(self._ready, (queue.entry_depth, seq, queue.host))
+        else:
+            queue.waiting = True
+            ready_at = now + (1 - queue.tokens) / self.rate if self.rate > 0 else float('inf')
+            heapq.heappush(self._waiting, (ready_at, seq, queue.host))
+
+    def _release_waiting(self, now):
+        """把令牌已恢复的主机移入就绪堆"""
+        while self._waiting and self._waiting[0][0] <= now:
+            _, seq, host = heapq.heappop(self._waiting)
+            queue = self._hosts[host]
+            if seq != queue.entry:
+                continue
+            queue.waiting = False
+            queue.entry_depth = queue.heap[0][0]
+            heapq.heappush(self._ready, (queue.entry_depth, seq, host))
@@ -0,0 +1,152 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+httrack缓存读取模块
+
+httrack把抓取到的内容和响应头保存在 hts-cache/new.zip 中：每个条目的内容为页面本身，
+本地文件头的扩展字段以 "名称: 值" 的文本行保存响应头（X-StatusCode、Content-Type、
+X-Save 等）。按条目在压缩包中的顺序顺序读取，省去遍历目录和大量小文件的随机读取，
+并可直接使用响应头中记录的字符集，而不必逐个尝试编码。
+"""
+
+import codecs
+import os
+import struct
+from collections import namedtuple
+
+CACHE_DIR_NAME = 'hts-cache'
+CACHE_ZIP_NAME = 'new.zip'
+
+# 本地文件头: 签名(4) 版本(2) 标志(2) 压缩方式(2) 时间(2) 日期(2) CRC(4) 压缩大小(4) 原始大小(4) 文件名长度(2) 扩展字段长度(2)
+_LOCAL_HEADER = struct.Struct('<4s5H3L2H')
+_LOCAL_SIGNATURE = b'PK\x03\x04'
+
+CacheEntry = namedtuple('CacheEntry', 'rel_path url status charset in_cache headers info')
+
+
+def find_cache_zip(download_dir):
+    """返回下载目录中的httrack缓存压缩包路径，不存在时返回None"""
+    path = os.path.join(download_dir, CACHE_DIR_NAME, CACHE_ZIP_NAME)
+    return path if os.path.isfile(path) else None
+
+
+def parse_headers(raw):
+    """解析扩展字段中的响应头文本，名称统一为小写"""
+    headers = {}
+    for line in raw.decode('iso-8859-1').splitlines():
+        name, sep, value = line.partition(':')
+        if sep:
+            headers[name.strip().lower()] = value.strip()
+    return headers
+
+
+def charset_of(headers):
+    """从Content-Type或X-Charset中取出字符集，无法识别时返回None"""
+    charset = None
+    for param in headers.get('content-type', '').split(';')[1:]:
+        name, _, value = param.partition('=')
+        if name.strip().lower() == 'charset':
+            charset = value.strip().strip('"\'')
+    charset = charset or headers.get('x-charset')
+    if not charset:
+        return None
+    try:
+        return codecs.lookup(charset).name
+    except LookupError:
+        return None
+
+
+class HtsCacheReader:
+    """httrack缓存压缩包的读取器
+
+    zip_path: hts-cache/new.zip 的路径
+    root: httrack的项目目录（即下载目录），X-Save 中的保存路径相对于该目录
+    """
+
+    def __init__(self, zip_path, root):
+        self.zip_path = zip_path
+        self.root = os.path.abspath(root)
+        self._zip = None
+        self._raw = None
+        self.stats = {'entries': 0, 'skipped_status': 0, 'skipped_path': 0}
+
+    def open(self):
+        import zipfile
+
+        self._zip = zipfile.ZipFile(self.zip_path)
+        self._raw = open(self.zip_path, 'rb')
+        return self
+
+    def close(self):
+        if self._zip is not None:
+            self._zip.close()
+            self._raw.close()
+            self._zip = self._raw = None
+
+    def __enter__(self):
+        return self.open()
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def _local_extra(self, info):
+        """读取本地文件头的扩展字段（httrack只在这里写入响应头）"""
+        self._raw.seek(info.header_offset)
+        header = self._raw.read(_LOCAL_HEADER.size)
+        fields = _LOCAL_HEADER.unpack(header)
+        if fields[0] != _LOCAL_SIGNATURE:
+            return b''
+        name_length, extra_length = fields[-2:]
+        self._raw.seek(name_length, os.SEEK_CUR)
+        return self._raw.read(extra_length)
+
+    def _rel_path(self, headers):
+        """根据 X-Save 计算相对于下载目录的路径，不在下载目录下时返回None"""
+        save = headers.get('x-save')
+        if not save:
+            return None
+        save = save.replace('/', os.sep)
+        if os.path.isabs(save):
+            save = os.path.relpath(save, self.root)
+        save = os.path.normpath(save)
+        if save.startswith('..') or os.path.isabs(save):
+            return None
+        return save
+
+    def entries(self):
+        """按压缩包中的存放顺序返回缓存条目，同一路径只保留最后一条记录"""
+        latest = {}
+        for info in sorted(self._zip.infolist(), key=lambda i: i.header_offset):
+            if info.is_dir():
+                continue
+            self.stats['entries'] += 1
+            headers = parse_headers(self._local_extra(info))
+            try:
+                status = int(headers.get('x-statuscode', '200'))
+            except ValueError:
+                status = 0
+            # 304 表示与上次镜像相比未变化，其余非 2xx 状态没有可用内容
+            if status != 304 and not 200 <= status < 300:
+                self.stats['skipped_status'] += 1
+                continue
+            rel_path = self._rel_path(headers)
+            if rel_path is None:
+                self.stats['skipped_path'] += 1
+                continue
+            latest.pop(rel_path, None)
+            latest[rel_path] = CacheEntry(
+                rel_path=rel_path,
+                url=info.filename,
+                status=status,
+                charset=charset_of(headers),
+                in_cache=headers.get('x-in-cache', '1') == '1' and info.file_size > 0,
+                headers=headers,
+                info=info,
+            )
+        return list(latest.values())
+
+    def read(self, entry):
+        """读取条目内容；内容未保存在缓存中时返回None（由调用方读取展开的文件）"""
+        if not entry.in_cache:
+            return None
+        return self._zip.read(entry.info)
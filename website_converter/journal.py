@@ -0,0 +1,133 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+运行日志模块
+
+记录已完成处理的文件，定期刷新到磁盘，使被超时或Ctrl+C中断的运行
+可以通过 --resume 从中断处继续。
+
+日志为JSON Lines格式：第一行是记录运行配置的头部，之后每行一个已完成文件，
+为相对路径字符串，或附带页面元数据时为 [相对路径, 元数据] 数组。
+"""
+
+import json
+import os
+import time
+
+JOURNAL_NAME = '.website_converter_journal.jsonl'
+JOURNAL_VERSION = 1
+
+
+class RunJournal:
+    """已完成文件日志
+
+    path: 日志文件路径
+    config: 运行配置（字典），恢复时与日志头部比较，不一致则日志作废
+    flush_interval: 两次刷新之间的最长秒数
+    flush_every: 缓冲达到多少条记录时刷新
+    before_flush: 刷新前调用的回调，用于确保日志中记录的文件确实已写入磁盘；
+                  返回写入失败的文件（相对路径）集合时，这些文件不记为已完成
+    """
+
+    def __init__(self, path, config, flush_interval=2.0, flush_every=200, before_flush=None):
+        self.path = path
+        self.config = config
+        self.flush_interval = flush_interval
+        self.flush_every = flush_every
+        self.before_flush = before_flush
+        self.completed = set()
+        self.metadata = {}
+        self._buffer = []
+        self._last_flush = time.monotonic()
+        self._file = None
+
+    def load(self):
+        """读取已有日志，返回已完成文件集合；日志不存在或配置不一致时返回None"""
+        if not os.path.exists(self.path):
+            return None
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                header = json.loads(f.readline() or 'null')
+                if not isinstance(header, dict) or header.get('version') != JOURNAL_VERSION \
+                        or header.get('config') != self.config:
+                    return None
+                completed = set()
+                metadata = {}
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        # 中断时可能留下写了一半的最后一行
+                        continue
+                    if isinstance(entry, list):
+                        rel_path, metadata[entry[0]] = entry
+                        entry = rel_path
+                    completed.add(entry)
+        except (OSError, ValueError) as e:
+            print(f"读取运行日志时出错: {str(e)}")
+            return None
+        self.completed = completed
+        self.metadata = metadata
+        return completed
+
+    def open(self, resume=False):
+        """打开日志准备追加；非恢复模式下重写头部"""
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        if resume and self.completed:
+            self._file = open(self.path, 'a', encoding='utf-8')
+        else:
+            self.completed = set()
+            self.metadata = {}
+            self._file = open(self.path, 'w', encoding='utf-8')
+            self._file.write(json.dumps({'version': JOURNAL_VERSION, 'config': self.config},
+                                        ensure_ascii=False) + '\n')
+            self._file.flush()
+        self._last_flush = time.monotonic()
+
+    def record(self, rel_path, metadata=None):
+        """记录一个已完成的文件及其可选的元数据，按条数或时间间隔触发刷新"""
+        self.completed.add(rel_path)
+        if metadata is not None:
+            self.metadata[rel_path] = metadata
+            self._buffer.append([rel_path, metadata])
+        else:
+            self._buffer.append(rel_path)
+        if len(self._buffer) >= self.flush_every or \
+                time.monotonic() - self._last_flush >= self.flush_interval:
+            self.flush()
+
+    def flush(self):
+        """把缓冲的记录写入磁盘"""
+        if self._file is None or not self._buffer:
+            self._last_flush = time.monotonic()
+            return
+        if self.before_flush is not None:
+            failed = self.before_flush()
+            if failed:
+                self._discard(failed)
+        if not self._buffer:
+            self._last_flush = time.monotonic()
+            return
+        self._file.write(''.join(json.dumps(p, ensure_ascii=False) + '\n' for p in self._buffer))
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        self._buffer = []
+        self._last_flush = time.monotonic()
+
+    def _discard(self, rel_paths):
+        """从缓冲中移除写入失败的文件，--resume 时重新处理它们"""
+        self._buffer = [entry for entry in self._buffer
+                        if (entry[0] if isinstance(entry, list) else entry) not in rel_paths]
+        for rel_path in rel_paths:
+            self.completed.discard(rel_path)
+            self.metadata.pop(rel_path, None)
+        print(f"{len(rel_paths)} 个文件写入失败，不记为已完成")
+
+    def close(self):
+        """刷新并关闭日志"""
+        self.flush()
+        if self._file is not None:
+            self._file.close()
+            self._file = None
@@ -0,0 +1,166 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+离线页面加载优化模块
+
+镜像页面仍然引用外部的字体、统计、广告和CDN脚本。在离线或内网环境中，
+每个这样的请求都要等到连接超时，阻塞页面渲染。本模块在链接修复之前改写页面：
+
+- 镜像中已有的外部资源改为站内地址
+- 统计、广告脚本和外部字体直接移除
+- 其余外部脚本加上 defer，外部样式表改为不阻塞渲染的加载方式，<style> 中的外部 @import 移除
+- 外部域名的 preconnect / dns-prefetch 等提示移除
+- 图片加上 loading="lazy" 与 decoding="async"
+"""
+
+import re
+
+# 统计与广告服务的域名（匹配域名本身及其子域名）
+TRACKER_HOSTS = (
+    'google-analytics.com', 'googletagmanager.com', 'googlesyndication.com', 'googleadservices.com',
+    'doubleclick.net', 'adservice.google.com', 'connect.facebook.net', 'hotjar.com', 'clarity.ms',
+    'scorecardresearch.com', 'quantserve.com', 'statcounter.com', 'hm.baidu.com', 'cnzz.com', '51.la',
+    'umeng.com', 'addthis.com', 'sharethis.com', 'disqus.com',
+)
+# 外部字体服务的域名
+FONT_HOSTS = ('fonts.googleapis.com', 'fonts.gstatic.com', 'use.typekit.net', 'fonts.loli.net', 'fonts.font.im')
+
+_EXTERNAL_RE = re.compile(r'^(?:https?:)?//', re.IGNORECASE)
+_HOST_RE = re.compile(r'^(?:https?:)?//([^/:?#]+)', re.IGNORECASE)
+
+# 带src属性的外部脚本：(开始标签)(内容)(结束标签)，只处理开始标签；内容可能不为空（如旧式的注释或配置）
+_SCRIPT_RE = re.compile(r'(<script\b[^>]*\ssrc\s*=[^>]*>)(.*?)(</script\s*>)', re.IGNORECASE | re.DOTALL)
+_LINK_RE = re.compile(r'<link\b[^>]*>', re.IGNORECASE)
+_IMG_RE = re.compile(r'<img\b[^>]*>', re.IGNORECASE)
+_STYLE_RE = re.compile(r'(<style\b[^>]*>)(.*?)(</style\s*>)', re.IGNORECASE | re.DOTALL)
+_IMPORT_RE = re.compile(r'@import\s+(?:url\(\s*)?["\']?([^"\')\s;]+)["\']?\s*\)?[^;]*;', re.IGNORECASE)
+
+_HINT_RELS = ('preconnect', 'dns-prefetch', 'preload', 'prefetch', 'modulepreload')
+
+
+def _attr(tag, name):
+    """读取标签的属性值，不存在时返回None"""
+    match = re.search(r'\s%s\s*=\s*(?:"([^"]*)"|\'([^\']*)\'|([^\s>]+))' % name, tag, re.IGNORECASE)
+    if match is None:
+        return None
+    return next(group for group in match.groups() if group is not None)
+
+
+def _has_attr(tag, name):
+    return re.search(r'\s%s(?:\s*=|[\s/>])' % name, tag, re.IGNORECASE) is not None
+
+
+def _add_attrs(tag, attrs):
+    """在标签末尾（自闭合斜杠之前）添加属性"""
+    end = len(tag) - 2 if tag.endswith('/>') else len(tag) - 1
+    return tag[:end].rstrip() + attrs + tag[end:]
+
+
+def is_external(url):
+    return bool(url) and _EXTERNAL_RE.match(url) is not None
+
+
+def classify(url):
+    """对外部资源分类：'tracker'（统计、广告）、'font'（字体服务）或 'other'"""
+    match = _HOST_RE.match(url)
+    host = match.group(1).lower() if match else ''
+    if any(host == h or host.endswith('.' + h) for h in TRACKER_HOSTS):
+        return 'tracker'
+    if any(host == h or host.endswith('.' + h) for h in FONT_HOSTS):
+        return 'font'
+    return 'other'
+
+
+def new_counts():
+    return {'removed': 0, 'deferred': 0, 'localized': 0, 'hints': 0, 'lazy_images': 0}
+
+
+class OfflineOptimizer:
+    """离线页面加载优化器
+
+    resolve: 函数，传入外部资源URL，资源已在镜像中时返回站内URL，否则返回None
+    """
+
+    def __init__(self, resolve):
+        self.resolve = resolve
+
+    def optimize(self, html):
+        """优化页面，返回 (新内容, 计数)"""
+        counts = new_counts()
+        html = _SCRIPT_RE.sub(lambda m: self._script(m, counts), html)
+        html = _LINK_RE.sub(lambda m: self._link(m.group(0), counts), html)
+        html = _STYLE_RE.sub(lambda m: m.group(1) + _IMPORT_RE.sub(lambda i: self._import(i, counts), m.group(2))
+                             + m.group(3), html)
+        html = _IMG_RE.sub(lambda m: self._img(m.group(0), counts), html)
+        return html, counts
+
+    def _localize(self, tag, url, counts):
+        local = self.resolve(url)
+        if local is None:
+            return None
+        counts['localized'] += 1
+        return tag.replace(url, local, 1)
+
+    def _script(self, match, counts):
+        tag, rest = match.group(1), match.group(2) + match.group(3)
+        url = _attr(tag, 'src')
+        if not is_external(url):
+            return match.group(0)
+        localized = self._localize(tag, url, counts)
+        if localized is not None:
+            return localized + rest
+        if classify(url) == 'tracker':
+            counts['removed'] += 1
+            return ''
+        if _has_attr(tag, 'async') or _has_attr(tag, 'defer') or (_attr(tag, 'type') or '').lower() == 'module':
+            return match.group(0)  # 本来就不阻塞解析
+        counts['deferred'] += 1
+        # 标签名可能是大写（<SCRIPT ...>），按已知位置插入属性
+        return tag[:len('<script')] + ' defer' + tag[len('<script'):] + rest
+
+    def _link(self, tag, counts):
+        url = _attr(tag, 'href')
+        if not is_external(url):
+            return tag
+        rels = (_attr(tag, 'rel') or '').lower().split()
+        if any(rel in _HINT_RELS for rel in rels):
+            counts['hints'] += 1
+            return ''
+        if 'stylesheet' not in rels:
+            return tag
+        localized = self._localize(tag, url, counts)
+        if localized is not None:
+            return localized
+        if classify(url) in ('tracker', 'font'):
+            counts['removed'] += 1
+            return ''
+        if _has_attr(tag, 'media'):
+            return tag
+        # 先按打印样式加载（不阻塞渲染），加载完成后再应用到屏幕
+        counts['deferred'] += 1
+        return _add_attrs(tag, ' media="print" onload="this.media=\'all\'"')
+
+    def _import(self, match, counts):
+        url = match.group(1)
+        if not is_external(url):
+            return match.group(0)
+        local = self.resolve(url)
+        if local is not None:
+            counts['localized'] += 1
+            return match.group(0).replace(url, local, 1)
+        counts['removed'] += 1
+        return ''
+
+    def _img(self, tag, counts):
+        url = _attr(tag, 'src')
+        if is_external(url):
+            tag = self._localize(tag, url, counts) or tag
+        attrs = ''
+        if not _has_attr(tag, 'loading'):
+            attrs += ' loading="lazy"'
+        if not _has_attr(tag, 'decoding'):
+            attrs += ' decoding="async"'
+        if attrs:
+            counts['lazy_images'] += 1
+            tag = _add_attrs(tag, attrs)
+        return tag
@@ -0,0 +1,262 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+按需转换服务模块
+
+直接以下载目录为数据源提供服务：HTML/Markdown页面在第一次被请求时才调用
+现有的 _fix_html_file / _convert_md_to_html 转换，结果缓存在输出目录（磁盘）和内存中，
+以源文件修改时间判断缓存是否有效。同一页面的并发请求合并为一次转换，
+索引页在第一次被请求时只读取每个文件开头部分的标题生成。
+"""
+
+import os
+import re
+import socketserver
+import threading
+from urllib.parse import unquote, urlsplit
+
+from website_converter.processors import build_dispatch_table
+from website_converter.server import MirrorHTTPServer, MirrorRequestHandler, ResponseCache
+
+# 读取标题时只读取文件开头的字节数
+TITLE_HEAD_BYTES = 8192
+
+_TITLE_RE = re.compile(rb'<title[^>]*>(.*?)</title>', re.IGNORECASE | re.DOTALL)
+_H1_RE = re.compile(rb'<h1[^>]*>(.*?)</h1>', re.IGNORECASE | re.DOTALL)
+
+# get() 的返回值：页面转换或写入失败，应返回错误响应（而不是提供输出目录中的旧文件）
+CONVERSION_FAILED = object()
+
+
+class OnDemandSite:
+    """按需转换的站点视图"""
+
+    def __init__(self, converter, cache=None):
+        self.converter = converter
+        self.download_dir = converter.download_dir
+        self.output_dir = converter.output_dir
+        self.domain = converter.domain
+        self.prefix = '/' + self.domain + '/'
+        self.cache = cache if cache is not None else ResponseCache()
+
+        self.dispatch, _ = build_dispatch_table(converter.args.file_types)
+        self._lock = threading.Lock()
+        self._inflight = {}
+        self._convert_lock = threading.Lock()
+        self._index_built = False
+
+        self.stats = {'conversions': 0, 'memory_hits': 0, 'disk_hits': 0, 'coalesced': 0, 'index_builds': 0,
+                      'failures': 0}
+
+    # ---- 路径映射 ----
+
+    def source_for(self, url_path):
+        """把请求路径映射到 (源文件, 处理器, 输出文件)，不需要转换时返回None"""
+        if not url_path.startswith(self.prefix):
+            return None
+        rel_path = url_path[len(self.prefix):]
+        if not rel_path or rel_path.endswith('/'):
+            rel_path += 'index.html'
+        rel_path = os.path.normpath(rel_path)
+        if rel_path.startswith('..') or os.path.isabs(rel_path):
+            return None
+
+        base, ext = os.path.splitext(rel_path)
+        # 请求.html时，源文件可能是同名的.html、.htm或.md
+        candidates = [rel_path]
+        if ext.lower() == '.html':
+            candidates += [base + '.htm', base + '.md']
+        for candidate in candidates:
+            processor = self.dispatch.get(os.path.splitext(candidate)[1].lower())
+            if processor is None:
+                continue
+            src_path = os.path.join(self.download_dir, candidate)
+            if os.path.isfile(src_path):
+                output_path = processor.output_path(os.path.join(self.output_dir, self.domain, candidate))
+                return src_path, processor, output_path
+        return None
+
+    def asset_path(self, url_path):
+        """静态资源直接从下载目录提供，不复制"""
+        if not url_path.startswith(self.prefix):
+            return None
+        rel_path = os.path.normpath(url_path[len(self.prefix):])
+        if rel_path.startswith('..') or os.path.isabs(rel_path):
+            return None
+        # 需要转换的页面不能绕过转换直接提供
+        if os.path.splitext(rel_path)[1].lower() in self.dispatch:
+            return None
+        path = os.path.join(self.download_dir, rel_path)
+        return path if os.path.isfile(path) else None
+
+    # ---- 页面获取 ----
+
+    def get(self, url_path):
+        """获取页面内容，返回 (内容, 修改时间)、CONVERSION_FAILED 或None（交给静态文件处理）"""
+        if url_path in ('/', '/index.html', self.prefix, self.prefix + 'index.html'):
+            self.ensure_index()
+            return None
+
+        mapping = self.source_for(url_path)
+        if mapping is None:
+            return None
+        src_path, processor, output_path = mapping
+        try:
+            src_stat = os.stat(src_path)
+        except OSError:
+            return None
+
+        entry = self.cache.get(url_path)
+        if entry is not None and entry[1] == src_stat.st_mtime:
+            self.stats['memory_hits'] += 1
+            return entry
+
+        # 合并并发请求：同一页面只有一个线程执行转换，其他线程等待结果
+        key = (url_path, src_stat.st_mtime_ns)
+        with self._lock:
+            event = self._inflight.get(key)
+            leader = event is None
+            if leader:
+                event = self._inflight[key] = threading.Event()
+                # 转换成功后由执行转换的线程改为False，等待的线程据此判断结果
+                event.failed = True
+        if not leader:
+            self.stats['coalesced'] += 1
+            event.wait()
+            if event.failed:
+                return CONVERSION_FAILED
+            entry = self.cache.get(url_path)
+            if entry is not None and entry[1] == src_stat.st_mtime:
+                return entry
+            # 页面太大没有进入内存缓存时，从已写好的磁盘缓存读取
+            return self.get(url_path)
+
+        try:
+            entry = self._load_or_convert(url_path, src_path, src_stat, processor, output_path)
+            if entry is None:
+                self.stats['failures'] += 1
+                return CONVERSION_FAILED
+            event.failed = False
+            return entry
+        finally:
+            with self._lock:
+                del self._inflight[key]
+            event.set()
+
+    def _load_or_convert(self, url_path, src_path, src_stat, processor, output_path):
+        """先查磁盘缓存（输出文件的修改时间与源文件一致即有效），否则转换；失败时返回None
+
+        只有确认写入成功后才把输出文件的修改时间设为源文件的修改时间，
+        写入失败时不会把旧的输出文件当作有效的缓存。
+        """
+        try:
+            out_stat = os.stat(output_path)
+            valid = out_stat.st_mtime_ns == src_stat.st_mtime_ns
+        except OSError:
+            valid = False
+
+        if valid:
+            self.stats['disk_hits'] += 1
+        else:
+            # 转换器的实例状态（链接缓存、写入器等）不是线程安全的，转换本身串行执行
+            writer = self.converter.writer
+            with self._convert_lock:
+                writer.tag = url_path
+                try:
+                    if not processor.process(self.converter, src_path, output_path):
+                        return None
+                finally:
+                    writer.tag = None
+                if url_path in writer.flush():
+                    print(f"按需转换失败: {url_path} 的输出文件写入失败")
+                    return None
+            try:
+                os.utime(output_path, ns=(src_stat.st_atime_ns, src_stat.st_mtime_ns))
+            except OSError as e:
+                print(f"按需转换失败: {url_path}\n{str(e)}")
+                return None
+            self.stats['conversions'] += 1
+
+        try:
+            with open(output_path, 'rb') as f:
+                body = f.read()
+        except OSError as e:
+            print(f"读取转换结果时出错: {url_path}\n{str(e)}")
+            return None
+        self.cache.put(url_path, body, src_stat.st_mtime)
+        return body, src_stat.st_mtime
+
+    # ---- 索引 ----
+
+    def ensure_index(self):
+        """第一次请求时生成索引页，只读取每个文件开头部分的标题"""
+        with self._lock:
+            if self._index_built:
+                return
+            self._index_built = True
+
+        converter = self.converter
+        file_info = []
+        for root, dirs, files in os.walk(self.download_dir):
+            for file in files:
+                if not file.endswith(('.html', '.htm')) or file == 'index.html':
+                    continue
+                file_path = os.path.join(root, file)
+                rel_path = os.path.relpath(file_path, self.download_dir)
+                file_info.append(converter._make_index_entry(rel_path, self.read_title(file_path)))
+
+        with self._convert_lock:
+            converter._write_index_pages(file_info)
+            converter.writer.flush()
+        self.stats['index_builds'] += 1
+        print(f"索引页已生成: {len(file_info)} 个页面")
+
+    def read_title(self, file_path):
+        """只读取文件开头部分提取标题"""
+        try:
+            with open(file_path, 'rb') as f:
+                head = f.read(TITLE_HEAD_BYTES)
+        except OSError:
+            head = b''
+        match = _TITLE_RE.search(head) or _H1_RE.search(head)
+        if match:
+            raw = match.group(1).strip()
+            # 只解码标题本身，避免文件开头被截断在多字节字符中间
+            for encoding in ['utf-8', 'gbk', 'gb2312', 'iso-8859-1']:
+                try:
+                    return raw.decode(encoding)
+                except UnicodeDecodeError:
+                    continue
+        return self.converter._get_title_from_html('', file_path)
+
+
+class OnDemandRequestHandler(MirrorRequestHandler):
+    """按需转换的请求处理器"""
+
+    def _cached_html(self):
+        url_path = unquote(urlsplit(self.path).path)
+        result = self.server.site.get(url_path)
+        if result is None:
+            # 索引页、默认CSS等由输出目录提供
+            return super()._cached_html()
+        if result is CONVERSION_FAILED:
+            self.send_error(500)
+            return b''
+        return self._send_html(*result)
+
+    def translate_path(self, path):
+        # 下载目录中存在的静态资源直接提供，其余（默认CSS、索引页）由输出目录提供
+        asset = self.server.site.asset_path(unquote(urlsplit(path).path))
+        if asset is not None:
+            return asset
+        return super().translate_path(path)
+
+
+class OnDemandHTTPServer(socketserver.ThreadingMixIn, MirrorHTTPServer):
+    """多线程的按需转换服务器"""
+
+    daemon_threads = True
+
+    def __init__(self, address, site, verbose=True):
+        self.site = site
+        super().__init__(address, OnDemandRequestHandler, cache=site.cache, verbose=verbose)
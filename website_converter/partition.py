@@ -0,0 +1,350 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+并行分区下载模块
+
+单个httrack进程是抓取的瓶颈，而提高它的连接数又会集中冲击同一个连接队列。
+本模块把站点按URL路径前缀（第一级目录）划分为互不重叠的分区，每个分区启动一个
+独立的httrack进程，使用各自的工作目录和连接数限制：
+
+- 分区0从入口URL开始，排除其他分区的前缀；其余分区只抓取自己的前缀（以及共用的样式、脚本、图片）
+- 前缀可以手工指定，或由站点地图、入口页面中的链接按数量均衡地分配到各分区
+- 通过解析httrack的输出汇总进度（已写入文件、字节数、错误数），不逐行解码回显
+- 全部结束后把各分区的文件硬链接（不支持时复制）到下载目录：内容相同的重叠文件只保留一份，
+  内容不同时以URL前缀所属分区的版本为准
+"""
+
+import filecmp
+import os
+import re
+import shutil
+import time
+from collections import deque
+from urllib.parse import urljoin, urlsplit
+
+# 各分区都允许抓取的共用资源（由合并步骤去重）
+ASSET_FILTERS = ('+*.css', '+*.js', '+*.png', '+*.jpg', '+*.jpeg', '+*.gif', '+*.svg', '+*.webp', '+*.ico',
+                 '+*.woff', '+*.woff2', '+*.ttf')
+# httrack在每个项目目录顶层生成的文件，不属于网站内容
+PROJECT_FILES = ('index.html', 'backblue.gif', 'fade.gif', 'hts-log.txt', 'hts-err.txt', 'hts-in_progress.lock',
+                 'hts-nohup.out', 'cookies.txt')
+CACHE_DIR_NAME = 'hts-cache'
+
+# httrack输出中可识别的行：
+#   12/40: example.com/docs/a.html (5120 bytes) - OK
+#   HTTrack Website Copier/3.49-2 mirror complete in 3 seconds : 26 links scanned, 24 files written
+#   (148187 bytes overall) [131584 bytes received at 43861 bytes/sec], 2 errors
+_FILE_RE = re.compile(rb'^\s*(\d+)/(\d+):\s+(\S+)\s+\((\d+) bytes\)')
+_SUMMARY_RE = re.compile(rb'(\d+) links scanned, (\d+) files written \((\d+) bytes overall\)')
+_SUMMARY_ERRORS_RE = re.compile(rb'(\d+) errors?\b')
+_ERROR_RE = re.compile(rb'\berror\b', re.IGNORECASE)
+_HREF_RE = re.compile(r'href=["\']([^"\'#]+)', re.IGNORECASE)
+_LOC_RE = re.compile(r'<loc>\s*([^<\s]+)\s*</loc>', re.IGNORECASE)
+
+
+def parse_output_line(line):
+    """解析一行httrack输出，返回事件元组或None
+
+    ('file', 已完成数, 已发现数, 路径, 字节数)
+    ('summary', 扫描链接数, 写入文件数, 字节数, 错误数)
+    ('error',)
+    """
+    match = _FILE_RE.match(line)
+    if match:
+        done, total, path, size = match.groups()
+        return 'file', int(done), int(total), path.decode('utf-8', errors='replace'), int(size)
+    match = _SUMMARY_RE.search(line)
+    if match:
+        errors = _SUMMARY_ERRORS_RE.search(line, match.end())
+        return ('summary', int(match.group(1)), int(match.group(2)), int(match.group(3)),
+                int(errors.group(1)) if errors else 0)
+    if _ERROR_RE.search(line):
+        return ('error',)
+    return None
+
+
+def path_prefix(url_path):
+    """URL路径的第一级目录前缀（如 /docs/），根目录下的文件返回None"""
+    parts = url_path.lstrip('/').split('/', 1)
+    if len(parts) < 2 or not parts[0]:
+        return None
+    return '/' + parts[0] + '/'
+
+
+class Partition:
+    """一个下载分区
+
+    prefixes: 分区负责的路径前缀；分区0（prefixes为空）负责其他分区之外的全部内容
+    seeds: 起始URL
+    """
+
+    def __init__(self, index, prefixes, seeds):
+        self.index = index
+        self.prefixes = list(prefixes)
+        self.seeds = list(seeds)
+        self.workdir = None
+        self.process = None
+        self.tail = deque(maxlen=20)
+        self.stats = {'files': 0, 'bytes': 0, 'discovered': 0, 'errors': 0, 'lines': 0}
+        self.summary = None
+
+    def describe(self):
+        return ', '.join(self.prefixes) if self.prefixes else '/ (其余部分)'
+
+
+def plan_partitions(entry_url, count, prefixes=None, urls=None):
+    """规划分区
+
+    prefixes: 手工指定的路径前缀；urls: 站点地图或入口页面中的URL，按第一级目录分组后
+    按URL数量从多到少依次分配给当前最少的分区。返回的分区数可能少于count（前缀不够时）。
+    """
+    parts = urlsplit(entry_url)
+    host = parts.netloc
+    root = f'{parts.scheme}://{host}'
+
+    groups = {}
+    if prefixes:
+        for prefix in prefixes:
+            prefix = '/' + prefix.strip('/') + '/'
+            groups[prefix] = [root + prefix]
+    else:
+        for url in urls or ():
+            url_parts = urlsplit(url)
+            if url_parts.netloc != host:
+                continue
+            prefix = path_prefix(url_parts.path)
+            if prefix is not None and prefix != path_prefix(parts.path):
+                groups.setdefault(prefix, []).append(url)
+
+    bins = [Partition(i + 1, [], []) for i in range(min(count - 1, len(groups)))]
+    for prefix, seeds in sorted(groups.items(), key=lambda item: (-len(item[1]), item[0])):
+        target = min(bins, key=lambda p: (sum(len(groups[x]) for x in p.prefixes), p.index))
+        target.prefixes.append(prefix)
+        target.seeds.extend(seeds)
+    return [Partition(0, [], [entry_url])] + bins
+
+
+def read_sitemap(source, limit=50):
+    """读取站点地图（本地文件或URL）中的所有URL，支持站点地图索引"""
+    from urllib.request import urlopen
+
+    urls = []
+    pending = [source]
+    visited = 0
+    while pending and visited < limit:
+        current = pending.pop()
+        visited += 1
+        if os.path.exists(current):
+            with open(current, 'r', encoding='utf-8', errors='replace') as f:
+                text = f.read()
+        else:
+            with urlopen(current, timeout=30) as response:
+                text = response.read().decode('utf-8', errors='replace')
+        locs = _LOC_RE.findall(text)
+        if '<sitemapindex' in text:
+            pending.extend(locs)
+        else:
+            urls.extend(locs)
+    return urls
+
+
+def discover_urls(entry_url):
+    """读取入口页面中的链接，用于在没有站点地图时划分分区"""
+    from urllib.request import urlopen
+
+    with urlopen(entry_url, timeout=30) as response:
+        text = response.read().decode('utf-8', errors='replace')
+    return [urljoin(entry_url, href) for href in _HREF_RE.findall(text)]
+
+
+class PartitionedDownload:
+    """并行分区下载驱动
+
+    partitions: plan_partitions() 的结果
+    work_root: 各分区工作目录的上级目录（保留以便 --continue 继续）
+    """
+
+    def __init__(self, entry_url, partitions, download_dir, work_root, depth=5, sockets=2,
+                 extra_options=(), httrack='httrack', resume=False):
+        self.entry_url = entry_url
+        self.partitions = partitions
+        self.download_dir = download_dir
+        self.work_root = work_root
+        self.depth = depth
+        self.sockets = sockets
+        self.extra_options = list(extra_options)
+        self.httrack = httrack
+        self.resume = resume
+        self.host = urlsplit(entry_url).netloc
+        self._stopped = False
+        self.merge_stats = {}
+
+    def build_command(self, partition):
+        """构建分区的httrack命令"""
+        partition.workdir = os.path.join(self.work_root, f'part-{partition.index}')
+        os.makedirs(partition.workdir, exist_ok=True)
+
+        seeds = partition.seeds
+        if len(seeds) > 20:
+            # 种子URL较多时写入列表文件，避免命令行过长
+            list_path = os.path.join(partition.workdir, 'seeds.txt')
+            with open(list_path, 'w', encoding='utf-8') as f:
+                f.write('\n'.join(seeds) + '\n')
+            seeds = ['-%L', list_path]
+
+        cmd = [self.httrack] + seeds + [
+            '--path', partition.workdir,
+            '--depth', str(self.depth),
+            f'--sockets={self.sockets}',
+            '--quiet',
+            '--display',
+        ]
+        # 过滤规则：后面的规则优先
+        if partition.prefixes:
+            cmd.append('-*')
+            cmd.extend(f'+{self.host}{prefix}*' for prefix in partition.prefixes)
+            cmd.extend(ASSET_FILTERS)
+        else:
+            others = [prefix for p in self.partitions for prefix in p.prefixes]
+            cmd.extend(f'-{self.host}{prefix}*' for prefix in others)
+            cmd.extend(ASSET_FILTERS)
+        cmd.extend(self.extra_options)
+        if self.resume:
+            cmd.append('--continue')
+        return cmd
+
+    def owner_of(self, rel_path):
+        """下载目录中的相对路径（域名/路径）归属的分区序号"""
+        parts = rel_path.replace(os.sep, '/').split('/', 1)
+        url_path = '/' + parts[1] if len(parts) == 2 else '/'
+        for partition in self.partitions:
+            if any(url_path.startswith(prefix) for prefix in partition.prefixes):
+                return partition.index
+        return 0
+
+    def _read_output(self, partition):
+        """后台线程：解析分区进程的输出，更新统计"""
+        stats = partition.stats
+        for line in iter(partition.process.stdout.readline, b''):
+            stats['lines'] += 1
+            partition.tail.append(line)
+            event = parse_output_line(line)
+            if event is None:
+                continue
+            if event[0] == 'file':
+                stats['files'] += 1
+                stats['discovered'] = max(stats['discovered'], event[2])
+                stats['bytes'] += event[4]
+            elif event[0] == 'summary':
+                partition.summary = {'links': event[1], 'files': event[2], 'bytes': event[3], 'errors': event[4]}
+            else:
+                stats['errors'] += 1
+
+    def progress_line(self):
+        """各分区进度的汇总文本"""
+        parts = []
+        for p in self.partitions:
+            state = '完成' if p.process is not None and p.process.poll() is not None else '进行中'
+            parts.append(f"分区{p.index} {p.stats['files']}/{p.stats['discovered']} 个文件 "
+                         f"{p.stats['bytes'] / 1024 / 1024:.1f}MB {state}")
+        total = sum(p.stats['files'] for p in self.partitions)
+        return f"下载进度: 共 {total} 个文件 | " + ' | '.join(parts)
+
+    def run(self, interval=2.0):
+        """启动全部分区并等待结束，返回是否全部成功"""
+        import subprocess
+        import threading
+
+        readers = []
+        for partition in self.partitions:
+            cmd = self.build_command(partition)
+            print(f"分区{partition.index} [{partition.describe()}]: {len(partition.seeds)} 个起始URL，"
+                  f"工作目录 {partition.workdir}")
+            partition.process = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.STDOUT)
+            reader = threading.Thread(target=self._read_output, args=(partition,), daemon=True)
+            reader.start()
+            readers.append(reader)
+
+        last = None
+        while any(p.process.poll() is None for p in self.partitions):
+            time.sleep(interval)
+            line = self.progress_line()
+            if line != last:
+                print(line)
+                last = line
+        for reader in readers:
+            reader.join()
+        line = self.progress_line()
+        if line != last:
+            print(line)
+
+        ok = True
+        for partition in self.partitions:
+            code = partition.process.returncode
+            if partition.summary:
+                s = partition.summary
+                print(f"分区{partition.index}: 扫描 {s['links']} 个链接，写入 {s['files']} 个文件 "
+                      f"({s['bytes'] / 1024 / 1024:.1f}MB)，{s['errors']} 个错误")
+            if code != 0 and not self._stopped:
+                ok = False
+                print(f"分区{partition.index} 下载失败，返回代码: {code}，最后的输出:")
+                for line in partition.tail:
+                    print('    ' + line.decode('utf-8', errors='replace').rstrip())
+        return ok and not self._stopped
+
+    def terminate(self):
+        """停止全部分区（供超时或Ctrl+C时调用）"""
+        self._stopped = True
+        for partition in self.partitions:
+            if partition.process is not None and partition.process.poll() is None:
+                partition.process.terminate()
+
+    def _place(self, src, dst):
+        """把分区文件放到下载目录：优先硬链接，不支持时复制"""
+        os.makedirs(os.path.dirname(dst), exist_ok=True)
+        try:
+            os.link(src, dst)
+            self.merge_stats['linked'] += 1
+        except OSError:
+            shutil.copy2(src, dst)
+            self.merge_stats['copied'] += 1
+
+    def merge(self):
+        """把各分区的文件合并到下载目录并处理重叠，返回统计"""
+        self.merge_stats = stats = {'linked': 0, 'copied': 0, 'identical': 0, 'replaced': 0, 'kept': 0}
+        origin = {}  # 相对路径 -> 本次合并中提供该文件的分区序号
+        for partition in self.partitions:
+            workdir = partition.workdir
+            for root, dirs, files in os.walk(workdir):
+                if root == workdir:
+                    dirs[:] = [d for d in dirs if d != CACHE_DIR_NAME]
+                    files = [f for f in files if f not in PROJECT_FILES and f != 'seeds.txt']
+                for name in files:
+                    src = os.path.join(root, name)
+                    rel_path = os.path.relpath(src, workdir)
+                    dst = os.path.join(self.download_dir, rel_path)
+
+                    if os.path.lexists(dst):
+                        if os.path.samefile(src, dst) or filecmp.cmp(src, dst, shallow=False):
+                            stats['identical'] += 1
+                            origin.setdefault(rel_path, partition.index)
+                            continue
+                        # 内容不同：上次运行留下的旧文件直接替换；本次已合并的文件以归属分区为准，
+                        # 都不归属时保留较新的版本
+                        previous = origin.get(rel_path)
+                        owner = self.owner_of(rel_path)
+                        if previous is None or owner == partition.index:
+                            replace = True
+                        elif owner == previous:
+                            replace = False
+                        else:
+                            replace = os.path.getmtime(src) > os.path.getmtime(dst)
+                        if not replace:
+                            stats['kept'] += 1
+                            continue
+                        os.remove(dst)
+                        stats['replaced'] += 1
+
+                    self._place(src, dst)
+                    origin[rel_path] = partition.index
+        return stats
@@ -0,0 +1,127 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+文件处理器注册模块
+
+按扩展名登记文件处理器，重量级依赖（如markdown）只在第一次真正使用时才导入，
+处理流程通过扩展名查表在O(1)时间内找到对应的处理器。
+"""
+
+import importlib
+import importlib.util
+import os
+
+
+class LazyModule:
+    """延迟导入的模块代理，第一次访问属性时才真正导入"""
+
+    def __init__(self, name, install_hint=None):
+        self.name = name
+        self.install_hint = install_hint
+        self._module = None
+        self._available = None
+        self._warned = False
+
+    def available(self):
+        """检查模块是否可用（只查找模块，不执行导入）"""
+        if self._available is None:
+            try:
+                self._available = importlib.util.find_spec(self.name) is not None
+            except (ImportError, ValueError):
+                self._available = False
+            if not self._available and not self._warned and self.install_hint:
+                self._warned = True
+                print(self.install_hint)
+        return self._available
+
+    def load(self):
+        """导入并返回真实模块"""
+        if self._module is None:
+            self._module = importlib.import_module(self.name)
+        return self._module
+
+    def __getattr__(self, attr):
+        return getattr(self.load(), attr)
+
+
+markdown = LazyModule(
+    'markdown',
+    install_hint="警告: 未安装markdown库，将无法转换Markdown文件。请使用pip安装: pip install markdown"
+)
+
+
+class FileProcessor:
+    """文件处理器描述
+
+    kind: 处理器类型，与 --file-types 展开后的取值（md/html/all）对应
+    extensions: 处理的扩展名（小写，带点）
+    method: WebsiteConverter上的处理方法名，签名为 (src_path, output_path)
+    output_ext: 输出文件扩展名，None表示保持原扩展名
+    requires: 依赖的延迟模块列表，首次使用时检查
+    """
+
+    def __init__(self, kind, extensions, method, label, output_ext=None, requires=()):
+        self.kind = kind
+        self.extensions = tuple(extensions)
+        self.method = method
+        self.label = label
+        self.output_ext = output_ext
+        self.requires = tuple(requires)
+
+    def available(self):
+        """检查依赖是否满足"""
+        return all(module.available() for module in self.requires)
+
+    def output_path(self, output_path):
+        """计算处理后的输出路径"""
+        if self.output_ext:
+            return os.path.splitext(output_path)[0] + self.output_ext
+        return output_path
+
+    def process(self, converter, src_path, output_path, content=None, charset=None):
+        """调用转换器上的处理方法
+
+        content: 已读取的文件内容（如来自httrack缓存），为None时由处理方法读取src_path
+        charset: 已知的字符集（如响应头中记录的），为None时自动检测
+        """
+        method = getattr(converter, self.method)
+        if content is None:
+            return method(src_path, output_path)
+        return method(src_path, output_path, content=content, charset=charset)
+
+
+# 处理器注册表：扩展名 -> 处理器
+_REGISTRY = {}
+# 复制处理器，仅在 --file-types all 时作为默认处理器使用
+COPY_PROCESSOR = FileProcessor('all', (), '_copy_file', '复制')
+
+
+def register_processor(processor):
+    """登记处理器，后登记的同扩展名处理器会覆盖先前的"""
+    for ext in processor.extensions:
+        _REGISTRY[ext.lower()] = processor
+    return processor
+
+
+def get_processor(ext):
+    """按扩展名查找已登记的处理器"""
+    return _REGISTRY.get(ext.lower())
+
+
+def build_dispatch_table(file_types):
+    """根据文件类型选项构建扩展名到处理器的分派表
+
+    返回 (table, default)，table中查不到的扩展名交给default处理（可能为None）
+    """
+    process_all = 'all' in file_types
+    table = {}
+    for ext, processor in _REGISTRY.items():
+        if process_all or processor.kind in file_types:
+            table[ext] = processor
+    default = COPY_PROCESSOR if process_all else None
+    return table, default
+
+
+register_processor(FileProcessor('md', ('.md',), '_convert_md_to_html', '转换MD',
+                                 output_ext='.html', requires=(markdown,)))
+register_processor(FileProcessor('html', ('.html', '.htm'), '_fix_html_file', '修复HTML'))
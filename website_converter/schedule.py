@@ -0,0 +1,188 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+截止时间感知的转换调度模块
+
+运行受 --timeout 或 --limit 限制时，按遍历顺序处理文件往往先处理完偏僻的资源目录，
+重要页面却来不及转换。本模块为每个文件估计价值与成本：
+
+- 价值：页面（HTML、Markdown）高于静态资源，目录层级越浅越高，入口页面直接链接的文件额外加权
+- 成本：按文件大小估计处理时间，处理过程中根据实际耗时不断校正
+
+文件按 价值/成本 从高到低处理；调度器跟踪剩余时间，始终为生成索引预留时间，
+剩余时间不足以处理某个文件时跳过它，继续尝试更小的文件。
+"""
+
+import os
+import posixpath
+import re
+import time
+
+from website_converter.fingerprint import is_asset
+
+PAGE_EXTENSIONS = ('.html', '.htm', '.md')
+
+# 各类文件的基础价值：页面远高于资源，除非页面极大或层级极深，总是先于资源处理
+KIND_VALUES = {'page': 100.0, 'asset': 2.0, 'other': 1.0}
+# 入口页面直接链接的文件的价值倍数
+ENTRY_LINK_BONUS = 3.0
+
+# 处理时间的初始估计：每个文件的固定开销（秒）与每字节的开销（秒）
+INITIAL_COSTS = {
+    'page': (0.002, 2e-8),
+    'asset': (0.0005, 2e-9),
+    'other': (0.0005, 2e-9),
+}
+# 实际耗时校正系数的平滑权重
+CORRECTION_WEIGHT = 0.2
+
+# 生成索引的预留时间：固定开销，加上逐个读取页面标题的开销
+INDEX_BASE_SECONDS = 1.0
+INDEX_PAGE_SECONDS = 0.0005
+INDEX_BYTE_SECONDS = 5e-9
+# 预留时间最多占总时间预算的比例，避免预留过多导致什么都不处理
+INDEX_RESERVE_MAX_SHARE = 0.5
+
+ENTRY_CANDIDATES = ('index.html', 'index.htm', 'README.md', 'readme.md', 'index.md')
+
+_HREF_RE = re.compile(r'''\b(?:href|src)\s*=\s*["']([^"'#?]+)''', re.IGNORECASE)
+_SCHEME_RE = re.compile(r'^[a-zA-Z][a-zA-Z0-9+.-]*:|^//')
+
+
+def kind_of(rel_path):
+    """文件类别：'page'（HTML、Markdown）、'asset'（静态资源）或 'other'"""
+    ext = posixpath.splitext(rel_path)[1].lower()
+    if ext in PAGE_EXTENSIONS:
+        return 'page'
+    if is_asset(rel_path):
+        return 'asset'
+    return 'other'
+
+
+def path_depth(rel_path, site_root=''):
+    """文件所在目录相对站点根目录的层级（站点根目录下的文件为0）"""
+    rel_path = rel_path.replace(os.sep, '/')
+    if site_root and rel_path.startswith(site_root + '/'):
+        rel_path = rel_path[len(site_root) + 1:]
+    return rel_path.count('/')
+
+
+def find_entry_page(rel_paths, domain, url_path=''):
+    """在文件列表中找出入口页面，返回 (入口页面相对路径, 站点根目录)；找不到时返回 (None, '')
+
+    httrack把网站保存在 下载目录/域名/ 下，此时站点根目录为域名目录；
+    本地目录（如文档树）的站点根目录就是下载目录本身。
+    """
+    rel_paths = set(path.replace(os.sep, '/') for path in rel_paths)
+    url_path = url_path.strip('/')
+    for site_root in (domain, ''):
+        prefix = site_root + '/' if site_root else ''
+        candidates = []
+        if url_path:
+            candidates.append(prefix + url_path)
+            candidates.extend(prefix + url_path + '/' + name for name in ENTRY_CANDIDATES)
+        candidates.extend(prefix + name for name in ENTRY_CANDIDATES)
+        for candidate in candidates:
+            if candidate in rel_paths:
+                return candidate, site_root
+    return None, ''
+
+
+def entry_links(content, entry_rel, site_root=''):
+    """提取入口页面链接到的站内文件，返回相对路径（/ 分隔）集合"""
+    base_dir = posixpath.dirname(entry_rel)
+    links = set()
+    for url in _HREF_RE.findall(content):
+        url = url.strip()
+        if not url or _SCHEME_RE.match(url):
+            continue
+        if url.startswith('/'):
+            target = posixpath.join(site_root, url.lstrip('/')) if site_root else url.lstrip('/')
+        else:
+            target = posixpath.join(base_dir, url)
+        target = posixpath.normpath(target)
+        if target.startswith('..'):
+            continue
+        links.add(target)
+        if url.endswith('/'):
+            links.add(posixpath.join(target, 'index.html'))
+    return links
+
+
+class DeadlineScheduler:
+    """按 价值/成本 排序待处理文件，并在时间预算内决定每个文件是否还来得及处理
+
+    deadline: 截止时间（time.time() 的时间戳），None 表示不限时间
+    """
+
+    def __init__(self, deadline=None, clock=time.time):
+        self.deadline = deadline
+        self.clock = clock
+        self.reserve = 0.0
+        self.skipped = 0
+        self.skipped_pages = 0
+        self._items = {}
+        self._corrections = {kind: 1.0 for kind in INITIAL_COSTS}
+
+    def estimate(self, kind, size):
+        """估计处理一个文件的耗时（秒）"""
+        per_file, per_byte = INITIAL_COSTS[kind]
+        return (per_file + size * per_byte) * self._corrections[kind]
+
+    def score(self, rel_path, size, depth, linked):
+        value = KIND_VALUES[kind_of(rel_path)] / (1.0 + depth)
+        if linked:
+            value *= ENTRY_LINK_BONUS
+        return value / self.estimate(kind_of(rel_path), size)
+
+    def order(self, file_list, size_of, links=(), site_root=''):
+        """按得分从高到低排序文件列表（每项第二个元素为相对路径），同分时保持原顺序
+
+        size_of: 函数，传入列表项返回文件大小（字节）
+        """
+        links = set(links)
+        scored = []
+        for position, item in enumerate(file_list):
+            rel_path = item[1].replace(os.sep, '/')
+            size = size_of(item)
+            self._items[item[1]] = (kind_of(rel_path), size)
+            score = self.score(rel_path, size, path_depth(rel_path, site_root), rel_path in links)
+            scored.append((-score, position, item))
+        scored.sort(key=lambda entry: entry[:2])
+        return [item for _, _, item in scored]
+
+    def reserve_index(self, file_list, budget):
+        """根据要收录进索引的页面估计生成索引所需的时间并预留，返回预留的秒数"""
+        pages = [self._items[item[1]][1] for item in file_list
+                 if item[1] in self._items and self._items[item[1]][0] == 'page']
+        reserve = INDEX_BASE_SECONDS + len(pages) * INDEX_PAGE_SECONDS + sum(pages) * INDEX_BYTE_SECONDS
+        self.reserve = min(reserve, max(budget, 0) * INDEX_RESERVE_MAX_SHARE)
+        return self.reserve
+
+    def remaining(self):
+        """扣除索引预留时间后剩余的秒数，不限时间时返回None"""
+        if self.deadline is None:
+            return None
+        return self.deadline - self.clock() - self.reserve
+
+    def fits(self, rel_path):
+        """剩余时间是否足够处理该文件；不够时记录跳过"""
+        remaining = self.remaining()
+        if remaining is None:
+            return True
+        kind, size = self._items.get(rel_path, ('other', 0))
+        if self.estimate(kind, size) <= remaining:
+            return True
+        self.skipped += 1
+        if kind == 'page':
+            self.skipped_pages += 1
+        return False
+
+    def observe(self, rel_path, seconds):
+        """记录文件的实际处理耗时，校正同类文件的成本估计"""
+        if rel_path not in self._items:
+            return
+        kind, size = self._items[rel_path]
+        per_file, per_byte = INITIAL_COSTS[kind]
+        ratio = seconds / (per_file + size * per_byte)
+        self._corrections[kind] += CORRECTION_WEIGHT * (ratio - self._corrections[kind])
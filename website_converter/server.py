@@ -0,0 +1,166 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+内置HTTP服务器模块
+
+在标准库 SimpleHTTPRequestHandler 的基础上，为HTML页面增加内存缓存：
+命中缓存时不再读盘，监视模式更新文件后通过 invalidate() 刷新缓存的内容。
+带内容哈希的资源文件（见 fingerprint 模块）以 immutable 长期缓存的方式提供。
+"""
+
+import email.utils
+import http.server
+import os
+import socketserver
+import threading
+from urllib.parse import unquote, urlsplit
+
+from website_converter.fingerprint import is_fingerprinted
+
+# 带内容哈希的资源文件名随内容变化，可以让浏览器永久缓存、不再重新验证
+IMMUTABLE_CACHE_CONTROL = 'immutable, max-age=31536000'
+
+
+class ResponseCache:
+    """HTML页面的内存缓存，按URL路径存放 (内容, 修改时间)"""
+
+    def __init__(self, max_bytes=64 * 1024 * 1024, max_file_size=2 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self.max_file_size = max_file_size
+        self._entries = {}
+        self._size = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, path):
+        with self._lock:
+            entry = self._entries.get(path)
+            if entry is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+            return entry
+
+    def put(self, path, body, mtime):
+        if len(body) > self.max_file_size:
+            return
+        with self._lock:
+            old = self._entries.pop(path, None)
+            if old is not None:
+                self._size -= len(old[0])
+            # 超出容量时按插入顺序淘汰最早的条目
+            while self._entries and self._size + len(body) > self.max_bytes:
+                evicted, _ = self._entries.pop(next(iter(self._entries)))
+                self._size -= len(evicted)
+            self._entries[path] = (body, mtime)
+            self._size += len(body)
+
+    def invalidate(self, paths):
+        """使指定URL路径的缓存失效"""
+        with self._lock:
+            for path in paths:
+                entry = self._entries.pop(path, None)
+                if entry is not None:
+                    self._size -= len(entry[0])
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._size = 0
+
+
+class MirrorRequestHandler(http.server.SimpleHTTPRequestHandler):
+    """镜像站点请求处理器，HTML页面走内存缓存"""
+
+    def log_message(self, format, *args):
+        if self.server.verbose:
+            super().log_message(format, *args)
+
+    def send_response(self, code, message=None):
+        self._response_code = code
+        super().send_response(code, message)
+
+    def end_headers(self):
+        if getattr(self, '_response_code', None) == 200 and is_fingerprinted(unquote(urlsplit(self.path).path)):
+            self.send_header('Cache-Control', IMMUTABLE_CACHE_CONTROL)
+        super().end_headers()
+
+    def do_GET(self):
+        body = self._cached_html()
+        if body is None:
+            return super().do_GET()
+        # 304和错误响应没有响应体（错误响应已由 send_error 发送）
+        if body:
+            self.wfile.write(body)
+
+    def do_HEAD(self):
+        if self._cached_html() is None:
+            return super().do_HEAD()
+
+    def _cached_html(self):
+        """处理HTML页面请求并发送响应头，返回响应体；不适用缓存时返回None"""
+        cache = self.server.cache
+        url_path = unquote(urlsplit(self.path).path)
+        if url_path.endswith('/'):
+            url_path += 'index.html'
+        if cache is None or not url_path.endswith(('.html', '.htm')):
+            return None
+
+        entry = cache.get(url_path)
+        if entry is None:
+            file_path = self.translate_path(url_path)
+            try:
+                with open(file_path, 'rb') as f:
+                    mtime = os.fstat(f.fileno()).st_mtime
+                    body = f.read()
+            except OSError:
+                return None
+            cache.put(url_path, body, mtime)
+        else:
+            body, mtime = entry
+        return self._send_html(body, mtime)
+
+    def _send_html(self, body, mtime):
+        """发送HTML页面的响应头，返回响应体"""
+        # 浏览器带着 If-Modified-Since 重新验证且内容未变时返回304
+        since = self.headers.get('If-Modified-Since')
+        if since:
+            try:
+                if int(mtime) <= email.utils.parsedate_to_datetime(since).timestamp():
+                    self.send_response(304)
+                    self.end_headers()
+                    return b''
+            except (TypeError, ValueError, IndexError, OverflowError):
+                pass
+
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/html; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.send_header('Last-Modified', email.utils.formatdate(mtime, usegmt=True))
+        # 页面内容可能随监视模式更新，要求浏览器每次重新验证
+        self.send_header('Cache-Control', 'no-cache')
+        self.end_headers()
+        return body
+
+
+class MirrorHTTPServer(socketserver.TCPServer):
+    """镜像站点HTTP服务器"""
+
+    allow_reuse_address = True
+
+    def __init__(self, address, handler=MirrorRequestHandler, cache=None, verbose=True):
+        self.cache = cache if cache is not None else ResponseCache()
+        self.verbose = verbose
+        super().__init__(address, handler)
+
+    def invalidate(self, url_paths):
+        """文件更新后刷新缓存"""
+        self.cache.invalidate(url_paths)
+
+
+def serve_in_background(httpd):
+    """在后台线程中运行服务器，返回线程"""
+    thread = threading.Thread(target=httpd.serve_forever, name='mirror-http-server', daemon=True)
+    thread.start()
+    return thread
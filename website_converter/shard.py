@@ -0,0 +1,76 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+分片处理模块
+
+按相对路径的稳定哈希把下载目录划分为N个分片，各分片可在不同机器上
+（共享NFS输出目录）或本机的多个进程中独立转换。每个分片输出一个元数据片段
+（标题、分类、链接），最后由合并步骤直接根据片段生成索引页面，无需重新读取页面。
+"""
+
+import hashlib
+import json
+import os
+
+SHARD_DIR_NAME = '.shards'
+
+
+def parse_shard_spec(spec):
+    """解析 'i/N' 形式的分片参数，返回 (i, N)"""
+    try:
+        index, total = (int(part) for part in spec.split('/'))
+    except ValueError:
+        raise ValueError(f"分片参数格式错误: {spec}，应为 i/N，例如 0/4")
+    if total < 1 or not 0 <= index < total:
+        raise ValueError(f"分片参数超出范围: {spec}，要求 0 <= i < N")
+    return index, total
+
+
+def shard_of(rel_path, total):
+    """计算文件所属分片，使用统一的 / 分隔符保证跨平台结果一致"""
+    key = rel_path.replace(os.sep, '/').encode('utf-8')
+    return int.from_bytes(hashlib.md5(key).digest()[:8], 'big') % total
+
+
+def fragment_path(output_dir, index, total):
+    """分片元数据片段的路径"""
+    return os.path.join(output_dir, SHARD_DIR_NAME, f'shard-{index}-of-{total}.json')
+
+
+def write_fragment(output_dir, index, total, fragment):
+    """写入元数据片段（先写临时文件再重命名，合并时不会读到半个文件）"""
+    path = fragment_path(output_dir, index, total)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    temp_path = f'{path}.{os.getpid()}.tmp'
+    with open(temp_path, 'w', encoding='utf-8') as f:
+        json.dump(fragment, f, ensure_ascii=False)
+    os.replace(temp_path, path)
+    return path
+
+
+def load_fragments(output_dir):
+    """读取输出目录下的所有元数据片段
+
+    返回 (fragments, total, missing)：按分片序号排序的片段列表、分片总数、缺失的分片序号
+    """
+    shard_dir = os.path.join(output_dir, SHARD_DIR_NAME)
+    if not os.path.isdir(shard_dir):
+        return [], 0, []
+
+    fragments = {}
+    total = None
+    for name in sorted(os.listdir(shard_dir)):
+        if not (name.startswith('shard-') and name.endswith('.json')):
+            continue
+        with open(os.path.join(shard_dir, name), 'r', encoding='utf-8') as f:
+            fragment = json.load(f)
+        if total is None:
+            total = fragment['shards']
+        elif fragment['shards'] != total:
+            raise ValueError(f"分片数量不一致: {name} 为 {fragment['shards']}，其他片段为 {total}")
+        fragments[fragment['shard']] = fragment
+
+    if total is None:
+        return [], 0, []
+    missing = [i for i in range(total) if i not in fragments]
+    return [fragments[i] for i in sorted(fragments)], total, missing
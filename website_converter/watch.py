@@ -0,0 +1,143 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+源目录监视模块
+
+通过轮询监视下载目录的变化：目录的修改时间没变时不重新列目录，
+文件只比较 stat 得到的修改时间和大小，不读取或哈希文件内容。
+"""
+
+import os
+import time
+
+ADDED = 'added'
+MODIFIED = 'modified'
+DELETED = 'deleted'
+
+
+class TreeWatcher:
+    """目录树轮询监视器
+
+    root: 监视的根目录
+    ignore_dirs: 不监视的目录名（如 hts-cache）
+    """
+
+    def __init__(self, root, ignore_dirs=()):
+        self.root = root
+        self.ignore_dirs = set(ignore_dirs)
+        self._dirs = {}    # 相对目录 -> (修改时间, 文件名列表, 子目录名列表)
+        self._files = {}   # 相对路径 -> (修改时间ns, 大小)
+        self.stat_calls = 0
+        self.listdir_calls = 0
+
+    def snapshot(self):
+        """建立初始快照"""
+        self._dirs = {}
+        self._files = {}
+        self._scan_dir('', {})
+
+    def _scan_dir(self, rel_dir, changes):
+        """列出目录内容并记录，新出现的文件计入changes"""
+        path = os.path.join(self.root, rel_dir) if rel_dir else self.root
+        try:
+            dir_mtime = os.stat(path).st_mtime_ns
+            entries = list(os.scandir(path))
+        except OSError:
+            return
+        self.listdir_calls += 1
+
+        files, subdirs = [], []
+        for entry in entries:
+            rel_path = os.path.join(rel_dir, entry.name) if rel_dir else entry.name
+            try:
+                if entry.is_dir(follow_symlinks=False):
+                    if entry.name not in self.ignore_dirs:
+                        subdirs.append(entry.name)
+                        if rel_path not in self._dirs:
+                            self._scan_dir(rel_path, changes)
+                elif entry.is_file():
+                    files.append(entry.name)
+                    if rel_path not in self._files:
+                        st = entry.stat()
+                        self.stat_calls += 1
+                        self._files[rel_path] = (st.st_mtime_ns, st.st_size)
+                        changes[rel_path] = ADDED
+            except OSError:
+                continue
+        self._dirs[rel_dir] = (dir_mtime, files, subdirs)
+
+    def _forget_dir(self, rel_dir, changes):
+        """目录被删除时移除其下所有记录"""
+        _, files, subdirs = self._dirs.pop(rel_dir, (None, [], []))
+        for name in files:
+            rel_path = os.path.join(rel_dir, name) if rel_dir else name
+            if self._files.pop(rel_path, None) is not None:
+                changes[rel_path] = DELETED
+        for name in subdirs:
+            self._forget_dir(os.path.join(rel_dir, name) if rel_dir else name, changes)
+
+    def poll(self):
+        """检查一次变化，返回 {相对路径: ADDED/MODIFIED/DELETED}"""
+        changes = {}
+
+        # 目录修改时间变化说明有文件或子目录增删，只有这些目录需要重新列出
+        for rel_dir in list(self._dirs):
+            if rel_dir not in self._dirs:
+                continue  # 已随上级目录一并移除
+            mtime, old_files, old_subdirs = self._dirs[rel_dir]
+            path = os.path.join(self.root, rel_dir) if rel_dir else self.root
+            try:
+                current = os.stat(path).st_mtime_ns
+            except OSError:
+                self._forget_dir(rel_dir, changes)
+                continue
+            self.stat_calls += 1
+            if current == mtime:
+                continue
+
+            self._scan_dir(rel_dir, changes)
+            _, new_files, new_subdirs = self._dirs[rel_dir]
+            for name in set(old_files) - set(new_files):
+                rel_path = os.path.join(rel_dir, name) if rel_dir else name
+                if self._files.pop(rel_path, None) is not None:
+                    changes[rel_path] = DELETED
+            for name in set(old_subdirs) - set(new_subdirs):
+                self._forget_dir(os.path.join(rel_dir, name) if rel_dir else name, changes)
+
+        # 原地修改文件不会改变目录的修改时间，逐个比较文件的修改时间和大小
+        for rel_path, signature in list(self._files.items()):
+            if rel_path in changes:
+                continue
+            try:
+                st = os.stat(os.path.join(self.root, rel_path))
+            except OSError:
+                continue  # 下次目录扫描时按删除处理
+            self.stat_calls += 1
+            current = (st.st_mtime_ns, st.st_size)
+            if current != signature:
+                self._files[rel_path] = current
+                changes[rel_path] = MODIFIED
+        return changes
+
+    def wait_for_changes(self, interval=1.0, debounce=0.5, should_stop=None):
+        """等待变化并去抖：检测到变化后继续收集，直到安静debounce秒后返回合并的变化"""
+        pending = {}
+        last_change = None
+        while True:
+            if should_stop is not None and should_stop():
+                return pending
+            changes = self.poll()
+            now = time.monotonic()
+            if changes:
+                for rel_path, kind in changes.items():
+                    previous = pending.get(rel_path)
+                    if previous == ADDED and kind == DELETED:
+                        del pending[rel_path]  # 新建后又删除，视为没有变化
+                    elif previous == ADDED and kind == MODIFIED:
+                        continue
+                    else:
+                        pending[rel_path] = kind
+                last_change = now
+            if pending and now - last_change >= debounce:
+                return pending
+            time.sleep(min(interval, debounce) if pending else interval)
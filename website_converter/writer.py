@@ -0,0 +1,257 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+输出写入模块
+
+提供带目录创建缓存的后台写入器：已创建的目录只调用一次 makedirs，
+文件内容编码为字节后交给少量后台I/O线程写入，排队字节数有上限，
+可选先写临时文件再原子重命名。
+"""
+
+import os
+import shutil
+import time
+from collections import deque
+from itertools import count
+
+
+class OutputWriter:
+    """后台输出写入器
+
+    workers: 后台I/O线程数，0表示在调用线程中同步写入
+    max_queued_bytes: 排队等待写入的最大字节数，超过时 write() 阻塞等待
+    atomic: 是否先写入临时文件再用 os.replace 重命名
+
+    tag 属性为提交任务时附带的标记（如正在处理的源文件），写入失败的任务的标记由 flush() 返回
+    """
+
+    def __init__(self, workers=4, max_queued_bytes=32 * 1024 * 1024, atomic=False):
+        self.workers = max(0, workers)
+        self.max_queued_bytes = max(1, max_queued_bytes)
+        self.atomic = atomic
+
+        self._known_dirs = set()
+        self._jobs = deque()
+        self._queued_bytes = 0
+        self._pending = 0
+        self._threads = []
+        self._cond = None
+        self._stats_lock = None
+        self._temp_ids = count()
+        self._closed = False
+        self._failed = set()
+        self.tag = None
+
+        self.stats = {
+            'makedirs_calls': 0,
+            'makedirs_cached': 0,
+            'files_written': 0,
+            'files_copied': 0,
+            'bytes_written': 0,
+            'open_calls': 0,
+            'rename_calls': 0,
+            'errors': 0,
+            'write_seconds': 0.0,
+            'max_write_latency': 0.0,
+            'queue_wait_seconds': 0.0,
+        }
+
+    # ---- 目录缓存 ----
+
+    def ensure_dir(self, directory):
+        """确保目录存在，已知目录不再触发系统调用"""
+        if not directory or directory in self._known_dirs:
+            self.stats['makedirs_cached'] += 1
+            return
+        os.makedirs(directory, exist_ok=True)
+        self.stats['makedirs_calls'] += 1
+
+        # 记录目录本身及其所有上级目录
+        while directory and directory not in self._known_dirs:
+            self._known_dirs.add(directory)
+            parent = os.path.dirname(directory)
+            if parent == directory:
+                break
+            directory = parent
+
+    # ---- 写入接口 ----
+
+    def write(self, path, data, encoding='utf-8'):
+        """写入文件，str按encoding编码为字节"""
+        if isinstance(data, str):
+            data = data.encode(encoding)
+        self.ensure_dir(os.path.dirname(path))
+        self._submit(('write', path, data, self.tag), len(data))
+
+    def copy(self, src_path, dst_path):
+        """复制文件（保留元数据）"""
+        self.ensure_dir(os.path.dirname(dst_path))
+        try:
+            size = os.path.getsize(src_path)
+        except OSError:
+            size = 0
+        self._submit(('copy', src_path, dst_path, self.tag), size)
+
+    def flush(self):
+        """等待已排队的任务全部写入，后台线程继续运行；返回上次调用以来写入失败的任务的标记集合"""
+        if self._cond is not None:
+            with self._cond:
+                while self._pending:
+                    self._cond.wait()
+        failed, self._failed = self._failed, set()
+        return failed
+
+    def close(self):
+        """等待所有排队任务完成并停止后台线程"""
+        if self._cond is not None:
+            with self._cond:
+                self._closed = True
+                self._cond.notify_all()
+                while self._pending:
+                    self._cond.wait()
+            for thread in self._threads:
+                thread.join()
+            self._threads = []
+            self._cond = None
+            self._stats_lock = None
+        self._closed = False
+        return self.stats['errors'] == 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def format_stats(self):
+        """返回统计信息的单行文本"""
+        s = self.stats
+        avg = s['write_seconds'] / max(1, s['files_written'] + s['files_copied'])
+        return (f"makedirs: {s['makedirs_calls']} 次 (缓存命中 {s['makedirs_cached']} 次), "
+                f"open: {s['open_calls']} 次, rename: {s['rename_calls']} 次, "
+                f"写入 {s['files_written']} 个文件/{s['bytes_written']} 字节, 复制 {s['files_copied']} 个文件, "
+                f"平均延迟 {avg * 1000:.2f}ms, 最大延迟 {s['max_write_latency'] * 1000:.2f}ms, "
+                f"排队等待 {s['queue_wait_seconds']:.2f}s, 错误 {s['errors']} 个")
+
+    # ---- 内部实现 ----
+
+    def _submit(self, job, size):
+        """提交任务，同步模式下立即执行"""
+        if self.workers == 0:
+            self._execute(job, size)
+            return
+
+        if self._cond is None:
+            self._start()
+
+        with self._cond:
+            wait_start = time.perf_counter()
+            # 单个超大任务在队列为空时也允许进入
+            while self._queued_bytes and self._queued_bytes + size > self.max_queued_bytes:
+                self._cond.wait()
+            self.stats['queue_wait_seconds'] += time.perf_counter() - wait_start
+            self._jobs.append((job, size))
+            self._queued_bytes += size
+            self._pending += 1
+            self._cond.notify_all()
+
+    def _start(self):
+        """启动后台I/O线程"""
+        import threading
+
+        self._cond = threading.Condition()
+        self._stats_lock = threading.Lock()
+        for i in range(self.workers):
+            thread = threading.Thread(target=self._worker, name=f'output-writer-{i}', daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def _worker(self):
+        """后台线程主循环"""
+        while True:
+            with self._cond:
+                while not self._jobs and not self._closed:
+                    self._cond.wait()
+                if not self._jobs:
+                    return
+                job, size = self._jobs.popleft()
+
+            self._execute(job, size)
+
+            with self._cond:
+                self._queued_bytes -= size
+                self._pending -= 1
+                self._cond.notify_all()
+
+    def _execute(self, job, size):
+        """执行单个写入或复制任务"""
+        kind, src, dst, tag = job
+        start = time.perf_counter()
+        error = None
+        opens = renames = 0
+        try:
+            if kind == 'write':
+                opens, renames = self._write_bytes(src, dst)
+            else:
+                opens, renames = self._copy_file(src, dst)
+        except Exception as e:
+            error = e
+            print(f"写入文件时出错: {dst if kind == 'copy' else src}\n{str(e)}")
+        elapsed = time.perf_counter() - start
+
+        if self._stats_lock is not None:
+            with self._stats_lock:
+                self._record(kind, size, error, opens, renames, elapsed, tag)
+        else:
+            self._record(kind, size, error, opens, renames, elapsed, tag)
+
+    def _record(self, kind, size, error, opens, renames, elapsed, tag):
+        """累计统计信息，记录写入失败的任务的标记"""
+        if error is not None and tag is not None:
+            self._failed.add(tag)
+        s = self.stats
+        s['open_calls'] += opens
+        s['rename_calls'] += renames
+        s['write_seconds'] += elapsed
+        s['max_write_latency'] = max(s['max_write_latency'], elapsed)
+        if error is not None:
+            s['errors'] += 1
+        elif kind == 'write':
+            s['files_written'] += 1
+            s['bytes_written'] += size
+        else:
+            s['files_copied'] += 1
+
+    def _write_bytes(self, path, data):
+        """写入字节内容"""
+        target = self._temp_path(path) if self.atomic else path
+        try:
+            with open(target, 'wb') as f:
+                f.write(data)
+            if self.atomic:
+                os.replace(target, path)
+                return 1, 1
+            return 1, 0
+        except Exception:
+            if self.atomic and os.path.exists(target):
+                os.remove(target)
+            raise
+
+    def _copy_file(self, src_path, dst_path):
+        """复制文件，原子模式下同样经过临时文件"""
+        target = self._temp_path(dst_path) if self.atomic else dst_path
+        try:
+            shutil.copy2(src_path, target)
+            if self.atomic:
+                os.replace(target, dst_path)
+                return 2, 1
+            return 2, 0
+        except Exception:
+            if self.atomic and os.path.exists(target):
+                os.remove(target)
+            raise
+
+    def _temp_path(self, path):
+        """生成与目标同目录的临时文件名，保证重命名不跨文件系统"""
+        directory, name = os.path.split(path)
+        return os.path.join(directory, f'.{name}.{os.getpid()}.{next(self._temp_ids)}.tmp')